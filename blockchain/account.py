@@ -2,7 +2,10 @@
 import base58
 import bech32
 
-from blockchain.hash_methods import sha256
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+from blockchain.hash_methods import hash256
 
 
 def is_pk(data: bytes) -> bool:
@@ -33,28 +36,69 @@ def to_b58(data: bytes):
     return base58.b58encode(data)
 
 
-def to_address(data: bytes, tp: int):
+BECH32M_CONSTANT = 0x2bc830a3  # checksum constant of the segwit addresses of version 1 and above (BIP 350)
+
+
+def to_segwit_address(data: bytes, witver: int, hrp: str = "bc") -> str:
+    # bech32 for the version 0, bech32m for the next versions (e.g. Taproot)
+    values = [witver] + bech32.convertbits(list(data), 8, 5)
+    constant = 1 if witver == 0 else BECH32M_CONSTANT
+    polymod = bech32.bech32_polymod(bech32.bech32_hrp_expand(hrp) + values + [0] * 6) ^ constant
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join([bech32.CHARSET[d] for d in values + checksum])
+
+
+def to_address(data: bytes, tp: int) -> str:
+    # the addresses are cached, the data is copied so that the cache never refers to a larger buffer
+    return encode_address(bytes(data), tp)
+
+
+@lru_cache(maxsize=1 << 18)
+def encode_address(data: bytes, tp: int) -> str:
 
     if tp == 0 or tp == 1:
-        data = bytearray(b"\x00") + bytearray(data)
-        checksum = sha256(sha256(data))
-        checksum = bytearray(checksum)[:4]
-        data += checksum
-        data = bytes(data)
-        return to_b58(data=data).decode("utf-8")
+        data = b"\x00" + data
+        return to_b58(data=data + hash256(data)[:4]).decode("utf-8")
 
     elif tp == 2 or tp == 6:
-        data = bytearray(b"\x05") + bytearray(data)
-        checksum = sha256(sha256(data))
-        checksum = bytearray(checksum)[:4]
-        data += checksum
-        data = bytes(data)
-        return to_b58(data=data).decode("utf-8")
+        data = b"\x05" + data
+        return to_b58(data=data + hash256(data)[:4]).decode("utf-8")
 
     elif tp == 3 or tp == 4:
-        data = bytearray(data)
-        data = [int(e) for e in data]
-        return bech32.encode(hrp="bc", witver=0, witprog=data)
+        return to_segwit_address(data=data, witver=0)
+
+    elif tp == 5:
+        return to_segwit_address(data=data, witver=1)
 
     else:
         raise ValueError
+
+
+def to_addresses(hashes: Iterable[bytes], tps: Iterable[int]) -> List[str]:
+    # addresses of many owners (e.g. a table of nodes), each distinct (hash, type) is encoded once
+    pairs = [(bytes(data), int(tp)) for data, tp in zip(hashes, tps)]
+    addresses = {pair: encode_address(*pair) for pair in set(pairs)}
+    return [addresses[pair] for pair in pairs]
+
+
+def from_address(address: str) -> Tuple[int, bytes]:
+    # type and hash of an address, the inverse of to_address (the type of a P2PK or P2PKH address is 1, the type of
+    # a P2SH address is 2)
+    if address.lower().startswith("bc1"):
+        address = address.lower()
+        values = [bech32.CHARSET.index(c) for c in address[3:]]
+        polymod = bech32.bech32_polymod(bech32.bech32_hrp_expand("bc") + values)
+        witver, data = values[0], bytes(bech32.convertbits(values[1:-6], 5, 8, False))
+        if polymod != (1 if witver == 0 else BECH32M_CONSTANT):
+            raise ValueError(f"Invalid checksum: {address}")
+        if witver == 0 and len(data) in (20, 32):
+            return 3 if len(data) == 20 else 4, data
+        elif witver == 1 and len(data) == 32:
+            return 5, data
+        raise ValueError(f"Unsupported segwit address: {address}")
+    data = base58.b58decode_check(address)
+    if len(data) == 21 and data[0] == 0x00:
+        return 1, data[1:]
+    elif len(data) == 21 and data[0] == 0x05:
+        return 2, data[1:]
+    raise ValueError(f"Unsupported address: {address}")
@@ -1,7 +1,12 @@
 
+import os
+import atexit
 import hashlib
 from Crypto.Hash import RIPEMD160
 
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
 
 def hash160(data: bytes) -> bytes:
     return RIPEMD160.RIPEMD160Hash(hashlib.sha256(data).digest()).digest()
@@ -13,3 +18,50 @@ def sha256(data: bytes) -> bytes:
 
 def hash256(data: bytes) -> bytes:
     return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+thread_pools: Dict[int, ThreadPoolExecutor] = dict()  # the pools of the current process, by number of threads
+
+
+def thread_pool(n_threads: int) -> ThreadPoolExecutor:
+    # the threads are created once per process and shared by all its calls
+    if n_threads not in thread_pools:
+        thread_pools[n_threads] = ThreadPoolExecutor(max_workers=n_threads)
+    return thread_pools[n_threads]
+
+
+def shutdown_thread_pools():
+    for pool in thread_pools.values():
+        pool.shutdown(wait=True)
+    thread_pools.clear()
+
+
+# a pool inherited through a fork (e.g. by the workers of parallel_map) has no threads in the child, it is forgotten
+# there and the child creates its own pools
+os.register_at_fork(after_in_child=thread_pools.clear)
+atexit.register(shutdown_thread_pools)
+
+
+def hash256_segments(buffer, segments: Sequence[Sequence[Tuple[int, int]]], n_threads: int = 1) -> List[bytes]:
+    # double SHA256 of many messages stored as segments (start, end) of the same buffer, e.g. the ids of all the
+    # transactions of a block, where the message of a segwit transaction is its data without the marker, the flag
+    # and the witness
+    # the segments are fed to the hash without being copied or concatenated, and hashlib releases the GIL for the
+    # segments of 2048 bytes or more, so the large transactions can be hashed by several threads at the same time
+    with memoryview(buffer) as view:
+        if n_threads > 1 and len(segments) > n_threads:
+            size = -(-len(segments) // n_threads)
+            chunks = [segments[i: i + size] for i in range(0, len(segments), size)]
+            results = list(thread_pool(n_threads).map(lambda chunk: _hash256_segments(view, chunk), chunks))
+            return [digest for result in results for digest in result]
+        return _hash256_segments(view, segments)
+
+
+def _hash256_segments(view: memoryview, segments: Sequence[Sequence[Tuple[int, int]]]) -> List[bytes]:
+    digests = []
+    for message in segments:
+        h = hashlib.sha256()
+        for start, end in message:
+            h.update(view[start: end])
+        digests.append(hashlib.sha256(h.digest()).digest())
+    return digests
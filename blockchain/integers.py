@@ -0,0 +1,50 @@
+import struct
+
+import numpy as np
+
+from typing import Tuple
+
+
+uint16 = struct.Struct("<H")
+uint32 = struct.Struct("<I")
+uint64 = struct.Struct("<Q")
+
+
+def read_uint16(buffer, offset: int = 0) -> int:
+    return uint16.unpack_from(buffer, offset)[0]
+
+
+def read_uint32(buffer, offset: int = 0) -> int:
+    return uint32.unpack_from(buffer, offset)[0]
+
+
+def read_uint64(buffer, offset: int = 0) -> int:
+    return uint64.unpack_from(buffer, offset)[0]
+
+
+def read_variable_length_integer(buffer, offset: int = 0) -> Tuple[int, int]:
+    # return the integer and the position right after it
+    int_ = buffer[offset]
+    if int_ < 0xfd:
+        return int_, offset + 1
+    elif int_ == 0xfd:
+        return uint16.unpack_from(buffer, offset + 1)[0], offset + 3
+    elif int_ == 0xfe:
+        return uint32.unpack_from(buffer, offset + 1)[0], offset + 5
+    elif int_ == 0xff:
+        return uint64.unpack_from(buffer, offset + 1)[0], offset + 9
+    else:
+        raise ValueError
+
+
+def little_endian_to_int(data: bytes) -> int:
+    return int.from_bytes(data, byteorder="little")
+
+
+def big_endian_to_int(data: bytes) -> int:
+    return int.from_bytes(data, byteorder="big")
+
+
+def decode_values(buffer) -> np.ndarray:
+    # decode a buffer of concatenated 8-byte little-endian values (e.g. amounts in satoshis) in one call
+    return np.frombuffer(buffer, dtype="<i8").astype(np.int64)
@@ -0,0 +1,155 @@
+import numpy as np
+
+from typing import List, Tuple
+
+from blockchain.models.raw_block import RawBlock
+from blockchain.models.raw_transaction import RawInputTXO, RawOutputTXO, RawTransaction
+
+
+def gather(data: np.ndarray, starts: np.ndarray, width: int) -> np.ndarray:
+    # get the slices data[start:start+width] as the rows of a 2d array
+    return data[starts.reshape(-1, 1) + np.arange(width, dtype=np.int64)]
+
+
+class ColumnarBlock(object):  # a block stored as contiguous arrays, the offsets are relative to the block data
+
+    def __init__(self, data: bytes, hash: bytes, byte_start: int,
+                 tx_hash: np.ndarray, tx_inputs: np.ndarray, tx_outputs: np.ndarray,
+                 input_tx_hash_start: np.ndarray, input_vout: np.ndarray, input_sequence: np.ndarray,
+                 input_script_start: np.ndarray, input_script_end: np.ndarray,
+                 input_witness_start: np.ndarray, input_witness_end: np.ndarray,
+                 output_vout: np.ndarray, output_value: np.ndarray,
+                 output_script_start: np.ndarray, output_script_end: np.ndarray):
+
+        self.data = data  # raw data of the block, from the magic bytes to the end of the last transaction
+        self.hash = hash
+        self.byte_start = byte_start
+
+        self.tx_hash = tx_hash  # (num_transactions, 32) uint8
+        self.tx_inputs = tx_inputs  # the inputs of the transaction i are tx_inputs[i]:tx_inputs[i+1]
+        self.tx_outputs = tx_outputs  # the outputs of the transaction i are tx_outputs[i]:tx_outputs[i+1]
+
+        self.input_tx_hash_start = input_tx_hash_start
+        self.input_vout = input_vout  # -1 for the coinbase
+        self.input_sequence = input_sequence
+        self.input_script_start = input_script_start
+        self.input_script_end = input_script_end
+        self.input_witness_start = input_witness_start  # start == end when there is no witness
+        self.input_witness_end = input_witness_end
+
+        self.output_vout = output_vout
+        self.output_value = output_value  # int64, in satoshis
+        self.output_script_start = output_script_start
+        self.output_script_end = output_script_end
+
+        self.num_file = None
+        self.block_num = None
+
+        self._transactions = None
+
+    @property
+    def previous_hash(self) -> bytes:
+        return self.data[12:44]
+
+    @property
+    def byte_end(self) -> int:
+        return self.byte_start + len(self.data)
+
+    @property
+    def num_transactions(self) -> int:
+        return len(self.tx_hash)
+
+    @property
+    def array(self) -> np.ndarray:
+        return np.frombuffer(self.data, dtype=np.uint8)
+
+    @property
+    def input_position(self) -> np.ndarray:
+        # position in the block of the transaction of each input
+        return np.repeat(np.arange(self.num_transactions), np.diff(self.tx_inputs))
+
+    @property
+    def output_position(self) -> np.ndarray:
+        # position in the block of the transaction of each output
+        return np.repeat(np.arange(self.num_transactions), np.diff(self.tx_outputs))
+
+    @property
+    def input_tx_hash(self) -> np.ndarray:
+        # (num_inputs, 32) hashes of the transactions that have created the inputs (zeros for the coinbase)
+        tx_hash = gather(self.array, self.input_tx_hash_start, 32)
+        tx_hash[self.input_vout < 0] = 0
+        return tx_hash
+
+    @property
+    def input_txo_ids(self) -> np.ndarray:
+        # (num_inputs, 36) ids of the spent TXOs, i.e. hash + vout (big endian), the coinbase input is excluded
+        spent = self.input_vout >= 0
+        vout = self.input_vout[spent].astype(">u4").view(np.uint8).reshape(-1, 4)
+        return np.hstack([gather(self.array, self.input_tx_hash_start[spent], 32), vout])
+
+    @property
+    def output_txo_ids(self) -> np.ndarray:
+        # (num_outputs, 36) ids of the created TXOs
+        vout = self.output_vout.astype(">u4").view(np.uint8).reshape(-1, 4)
+        return np.hstack([self.tx_hash[self.output_position], vout])
+
+    @property
+    def output_value_bytes(self) -> np.ndarray:
+        # (num_outputs, 8) values as stored in the transactions
+        return self.output_value.astype("<i8").view(np.uint8).reshape(-1, 8)
+
+    def output_scripts(self) -> Tuple[bytes, np.ndarray]:
+        # all the locking scripts in one buffer, the script i is buffer[offsets[i]:offsets[i+1]]
+        scripts = [self.data[start: end] for start, end in zip(self.output_script_start.tolist(),
+                                                                self.output_script_end.tolist())]
+        offsets = np.zeros(len(scripts) + 1, dtype=np.int64)
+        np.cumsum(self.output_script_end - self.output_script_start, out=offsets[1:])
+        return b"".join(scripts), offsets
+
+    def input_scripts(self) -> Tuple[List[memoryview], List[memoryview]]:
+        # the unlocking scripts and the witnesses (empty if there is none) of the inputs, the ones of the coinbase
+        # excepted, as views of the data
+        view = memoryview(self.data)
+        first = int(self.tx_inputs[1]) if self.num_transactions > 0 else 0
+        scripts = [view[start: end] for start, end in zip(self.input_script_start[first:].tolist(),
+                                                           self.input_script_end[first:].tolist())]
+        witnesses = [view[start: end] for start, end in zip(self.input_witness_start[first:].tolist(),
+                                                             self.input_witness_end[first:].tolist())]
+        return scripts, witnesses
+
+    @property
+    def transactions(self) -> List[RawTransaction]:
+        # the transactions with the object API, built on first access
+        if self._transactions is None:
+            self._transactions = self.to_raw_transactions()
+        return self._transactions
+
+    def to_raw_transactions(self) -> List[RawTransaction]:
+        view = memoryview(self.data)
+        tx_inputs, tx_outputs = self.tx_inputs.tolist(), self.tx_outputs.tolist()
+        tx_hash_start, vout = self.input_tx_hash_start.tolist(), self.input_vout.tolist()
+        script_start, script_end = self.input_script_start.tolist(), self.input_script_end.tolist()
+        witness_start, witness_end = self.input_witness_start.tolist(), self.input_witness_end.tolist()
+        output_vout, output_value = self.output_vout.tolist(), self.output_value_bytes
+        output_script_start, output_script_end = self.output_script_start.tolist(), self.output_script_end.tolist()
+        transactions = []
+        for position in range(self.num_transactions):
+            txos_in = [RawInputTXO(tx_hash=view[tx_hash_start[i]: tx_hash_start[i] + 32] if vout[i] >= 0 else b"",
+                                   vout=vout[i],
+                                   script=view[script_start[i]: script_end[i]],
+                                   witness=view[witness_start[i]: witness_end[i]],
+                                   sequence=view[script_end[i]: script_end[i] + 4])
+                       for i in range(tx_inputs[position], tx_inputs[position + 1])]
+            txos_out = [RawOutputTXO(vout=output_vout[i], value=output_value[i].tobytes(),
+                                     script=view[output_script_start[i]: output_script_end[i]])
+                        for i in range(tx_outputs[position], tx_outputs[position + 1])]
+            transactions.append(RawTransaction(tx_hash=self.tx_hash[position].tobytes(), txos_in=txos_in,
+                                               txos_out=txos_out))
+        return transactions
+
+    def to_raw_block(self) -> RawBlock:
+        raw_block = RawBlock(hash=self.hash, previous_hash=self.previous_hash, byte_start=self.byte_start,
+                             byte_end=self.byte_end, transactions=self.transactions)
+        raw_block.num_file = self.num_file
+        raw_block.block_num = self.block_num
+        return raw_block
@@ -21,3 +21,19 @@ class RawBlock(object):
     @property
     def num_transactions(self):
         return len(self.transactions)
+
+
+class RawBlockHeader(object):  # a block read without parsing its transactions
+
+    def __init__(self, hash: bytes, previous_hash: bytes,
+                 byte_start: int, byte_end: int,
+                 num_transactions: int):
+
+        self.hash = hash
+        self.previous_hash = previous_hash
+        self.byte_start = byte_start
+        self.byte_end = byte_end
+        self.num_transactions = num_transactions
+
+        self.num_file = None
+        self.block_num = None
@@ -4,33 +4,61 @@ from typing import List, Optional
 from blockchain.script.match import match_owner_script, detect_script_in_unlocking, detect_script_in_witness
 
 
+NOT_COMPUTED = object()  # marks a cached attribute that has not been computed yet (None is a valid value)
+
+
 class RawInputTXO(object):
 
+    __slots__ = ("tx_hash", "vout", "script", "sequence", "_witness", "_witness_span", "_hidden_locking_script")
+
     def __init__(self, tx_hash: bytes, vout: int, script: bytes, witness: bytes, sequence: Optional[bytes] = None):
 
         self.tx_hash = tx_hash  # hash of the transaction in which the TXO was created
         self.vout = vout  # position in the output of the created transaction
         self.script = script  # unlocking script
-        self.witness = witness
         self.sequence = sequence
 
+        self._witness = witness
+        self._witness_span = None  # (buffer, start, end), the witness is buffer[start:end]
+        self._hidden_locking_script = NOT_COMPUTED
+
+    @property
+    def witness(self):
+        # the witness is only sliced from the buffer of the witnesses of the transaction on first access
+        if self._witness_span is not None:
+            buffer, start, end = self._witness_span
+            self._witness = buffer[start: end]
+            self._witness_span = None
+        return self._witness
+
     def update_witness(self, new_witness: bytes):
-        self.witness = new_witness
+        self._witness = new_witness
+        self._witness_span = None
+        self._hidden_locking_script = NOT_COMPUTED
+
+    def update_witness_span(self, buffer: bytes, start: int, end: int):
+        self._witness_span = (buffer, start, end)
+        self._hidden_locking_script = NOT_COMPUTED
 
     @property
     def txo_id(self):
-        return self.tx_hash + self.vout.to_bytes(4, byteorder="big")
+        return bytes(self.tx_hash) + self.vout.to_bytes(4, byteorder="big")
 
     @property
     def hidden_locking_script(self):
-        locking_script = detect_script_in_unlocking(script=self.script)
-        if locking_script is not None:  # script detected in the unlocking script
-            return locking_script
-        return detect_script_in_witness(self.witness)
+        # computed on first access
+        if self._hidden_locking_script is NOT_COMPUTED:
+            locking_script = detect_script_in_unlocking(script=self.script)
+            if locking_script is None:  # no script detected in the unlocking script
+                locking_script = detect_script_in_witness(self.witness)
+            self._hidden_locking_script = locking_script
+        return self._hidden_locking_script
 
 
 class RawOutputTXO(object):
 
+    __slots__ = ("tx_hash", "vout", "value", "script", "_owner")
+
     def __init__(self, vout: int, value: bytes, script: bytes, tx_hash: bytes = None):
 
         self.tx_hash = tx_hash  # hash of the transaction in which the TXO was created
@@ -38,20 +66,27 @@ class RawOutputTXO(object):
         self.value = value
         self.script = script  # locking script
 
+        self._owner = None
+
     def update_tx_hash(self, tx_hash: bytes):
         self.tx_hash = tx_hash
 
     @property
     def txo_id(self):
-        return self.tx_hash + self.vout.to_bytes(4, byteorder="big")
+        return bytes(self.tx_hash) + self.vout.to_bytes(4, byteorder="big")
 
     @property
     def owner(self):
-        return match_owner_script(script=self.script)
+        # computed on first access
+        if self._owner is None:
+            self._owner = match_owner_script(script=self.script)
+        return self._owner
 
 
 class RawTransaction(object):
 
+    __slots__ = ("tx_hash", "txos_in", "txos_out")
+
     def __init__(self, tx_hash: bytes, txos_in: List[RawInputTXO], txos_out: List[RawOutputTXO]):
 
         self.tx_hash = tx_hash
@@ -60,3 +95,9 @@ class RawTransaction(object):
 
         for txo in self.txos_out:
             txo.update_tx_hash(tx_hash=self.tx_hash)
+
+    def update_tx_hash(self, tx_hash: bytes):
+        # the hash can be computed after the parsing of the transaction, e.g. in a batch with the whole block
+        self.tx_hash = tx_hash
+        for txo in self.txos_out:
+            txo.update_tx_hash(tx_hash=tx_hash)
@@ -1,6 +1,4 @@
 
-import binascii
-
 import numpy as np
 import pandas as pd
 
@@ -8,11 +6,15 @@ from typing import List, Dict, Optional
 from tabulate import tabulate
 
 from blockchain.read_binary_files import internal_byte_order_to_hex
+from blockchain.integers import little_endian_to_int, big_endian_to_int, decode_values
 from blockchain.account import to_address
 
 
 class TXO(object):
 
+    __slots__ = ("txo_id", "value", "node_id", "tp", "node_hash", "reveal", "reuse", "alias",
+                 "_txo_position", "_value_int")
+
     def __init__(self, txo_id: bytes = None, value: bytes = None, node_id: int = None, tp: int = None,
                  node_hash: bytes = None, reveal: int = None, reuse: int = None, alias: int = None):
 
@@ -27,10 +29,15 @@ class TXO(object):
 
         self.alias = alias
 
+        self._txo_position = None
+        self._value_int = None
+
     @property
     def txo_position(self) -> int:
-        # return the position of the txo in the creation transaction output
-        return int(binascii.hexlify(self.txo_id[-4:]), 16)
+        # return the position of the txo in the creation transaction output, computed on first access
+        if self._txo_position is None:
+            self._txo_position = big_endian_to_int(self.txo_id[-4:])
+        return self._txo_position
 
     @property
     def tx_hash(self) -> bytes:
@@ -38,7 +45,10 @@ class TXO(object):
 
     @property
     def value_int(self):
-        return int(internal_byte_order_to_hex(bytes(self.value)), 16)
+        # computed on first access
+        if self._value_int is None:
+            self._value_int = little_endian_to_int(self.value)
+        return self._value_int
 
     @property
     def address(self) -> str:
@@ -47,6 +57,8 @@ class TXO(object):
 
 class Transaction(object):
 
+    __slots__ = ("block_num", "position", "input_txos", "output_txos", "_features")
+
     def __init__(self, block_num: int = None, position: int = None, input_txos: Optional[List[TXO]] = None,
                  output_txos: Optional[List[TXO]] = None):
 
@@ -55,6 +67,8 @@ class Transaction(object):
         self.input_txos = input_txos if input_txos is not None else []
         self.output_txos = output_txos if output_txos is not None else []
 
+        self._features = None
+
     @classmethod
     def from_rows(cls, block_num: int = None, position: int = None, input_txos: Optional[list] = None,
                   output_txos: Optional[list] = None):
@@ -64,7 +78,10 @@ class Transaction(object):
                    output_txos=[TXO(**row) for row in output_txos] if output_txos is not None else [])
 
     def compute_features(self):
-        return TransactionFeatures(transaction=self)
+        # the features are computed once, several heuristics use them
+        if self._features is None:
+            self._features = TransactionFeatures(transaction=self)
+        return self._features
 
     def __repr__(self):
         if len(self.output_txos) > 0:
@@ -136,8 +153,8 @@ class TransactionFeatures(object):
         self.output_ids = {txo.node_id for txo in transaction.output_txos}
         self.input_values = {txo.value_int for txo in transaction.input_txos}  # unique input values
 
-        output_values, occ_output_values = np.unique([txo.value_int for txo in transaction.output_txos],
-                                                     return_counts=True)
+        output_values, occ_output_values = np.unique(
+            decode_values(b"".join([txo.value for txo in transaction.output_txos])), return_counts=True)
         desc_sorted_output_values = [(v, c) for v, c in zip(output_values, occ_output_values)]
         desc_sorted_output_values = sorted(desc_sorted_output_values, key=lambda x: x[1], reverse=True)
 
@@ -0,0 +1,25 @@
+import os
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+
+def parallel_map(function: Callable, tasks: Iterable[dict], n_jobs: int = -1, max_pending: Optional[int] = None,
+                 **kwargs) -> Iterator:
+    # call function(**task, **kwargs) in worker processes and yield the results in the order of the tasks
+    # at most max_pending results are computed ahead of the consumer: the processing of the results (e.g. the
+    # insertion in the database) overlaps with the workers while the memory stays bounded
+    n_jobs = os.cpu_count() if n_jobs is None or n_jobs < 0 else n_jobs
+    max_pending = 2 * n_jobs if max_pending is None else max_pending
+    executor = ProcessPoolExecutor(max_workers=n_jobs)
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(executor.submit(function, **task, **kwargs))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
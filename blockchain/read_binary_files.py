@@ -1,113 +1,413 @@
-
 import os
+import mmap
+import struct
 import binascii
+import warnings
+
+import numpy as np
 
-from blockchain.hash_methods import hash256
+from blockchain.hash_methods import hash256, hash256_segments
+from blockchain.integers import read_uint32, read_uint64, read_variable_length_integer
 from blockchain.models.raw_transaction import RawInputTXO, RawOutputTXO, RawTransaction
-from blockchain.models.raw_block import RawBlock
-from typing import List
-
-
-def read_variable_length_integer(f):
-    byte_ = f.read(1)
-    hex_ = binascii.hexlify(byte_)
-    int_ = int(hex_, 16)
-    if int_ < 0xfd:
-        return int_
-    elif int_ == 0xfd:
-        return int(binascii.hexlify(f.read(2)[::-1]), 16)
-    elif int_ == 0xfe:
-        return int(binascii.hexlify(f.read(4)[::-1]), 16)
-    elif int_ == 0xff:
-        return int(binascii.hexlify(f.read(8)[::-1]), 16)
-    else:
-        raise ValueError
+from blockchain.models.raw_block import RawBlock, RawBlockHeader
+from blockchain.models.columnar_block import ColumnarBlock
+from functools import lru_cache, partial
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+NULL_HASH = b"\x00" * 32  # previous hash of the genesis block
+MAGIC = b"\xf9\xbe\xb4\xd9"  # network magic bytes of the mainnet, at the start of each block record
+
+
+def file_number(file: str) -> int:
+    return int(file.split(".")[0].replace("blk", ""))
+
+
+def file_name(num_file: int) -> str:
+    return f"blk{num_file:05d}.dat"
+
+
+def list_block_files(folder: str) -> List[str]:
+    files = [file for file in os.listdir(folder) if file.startswith("blk") and file.endswith(".dat")]
+    return sorted(files, key=file_number)
+
+
+@lru_cache(maxsize=None)
+def read_xor_key(folder: str) -> Optional[bytes]:
+    # recent versions of Bitcoin Core obfuscate the blk files with the key stored in xor.dat
+    path = os.path.join(folder, "xor.dat")
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        key = f.read()
+    return key if any(key) else None  # a key of zeros leaves the files unchanged
+
+
+def deobfuscate(data, position: int, key: bytes) -> bytes:
+    # XOR the data read at the given position of the file with the key, the byte at the position p of the file is
+    # XORed with key[p % len(key)]
+    shift = position % len(key)
+    pattern = np.frombuffer(key[shift:] + key[:shift], dtype=np.uint8)
+    data = np.frombuffer(data, dtype=np.uint8)
+    return np.bitwise_xor(data, np.resize(pattern, len(data))).tobytes()
+
+
+def read_bytes(buffer, start: int, end: int, key: Optional[bytes] = None):
+    # bytes start:end of the file, only these bytes are de-obfuscated
+    return buffer[start: end] if key is None else deobfuscate(buffer[start: end], start, key)
+
+
+def map_file(file: str, folder: str, zero_copy: bool = False):
+    # map the whole file in memory, the pages are only read when they are accessed
+    # zero_copy: slices are memoryviews of the mapping instead of new bytes objects
+    # an obfuscated file is mapped as it is, the records are de-obfuscated when they are read (see read_record)
+    with open(os.path.join(folder, file), "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapping).toreadonly() if zero_copy else mapping
+
+
+def find_magic(buffer, start: int, magic: bytes = MAGIC, key: Optional[bytes] = None,
+               chunk_size: int = 1 << 20) -> int:
+    # position of the next block record, -1 if there is none (e.g. the rest of the file is zero padding)
+    source = buffer.obj if isinstance(buffer, memoryview) else buffer
+    if key is None:
+        return source.find(magic, start)
+    # an obfuscated file is de-obfuscated chunk by chunk, the chunks overlap so that the magic bytes can be found
+    # across two chunks
+    for position in range(start, len(source), chunk_size):
+        found = read_bytes(source, position, position + chunk_size + len(magic) - 1, key).find(magic)
+        if found >= 0:
+            return position + found
+    return -1
+
+
+def read_record(parse, buffer, offset: int, key: Optional[bytes] = None, zero_copy: bool = False,
+                size: Optional[int] = None):
+    # parse(buffer, offset) the block record at offset, an obfuscated record (only its size first bytes if size is
+    # given) is de-obfuscated in a copy which is parsed, the positions of the block are then those of the file
+    if key is None:
+        return parse(buffer, offset)
+    if size is None:
+        size = 8 + read_uint32(read_bytes(buffer, offset + 4, offset + 8, key))
+    record = read_bytes(buffer, offset, offset + size, key)
+    block, next_offset = parse(memoryview(record) if zero_copy else record, 0)
+    block.byte_start += offset
+    if isinstance(block, (RawBlock, RawBlockHeader)):  # the end of a ColumnarBlock is given by its data
+        block.byte_end += offset
+    return block, next_offset + offset
 
 
 def internal_byte_order_to_hex(s: bytes) -> hex:
-    return binascii.hexlify(s[::-1]).decode("utf-8")
+    return binascii.hexlify(bytes(s)[::-1]).decode("utf-8")
 
 
-def process_transaction(f, coinbase: bool = False, drop_zero: bool = True) -> RawTransaction:
-    byte_start = f.tell()  # easily retrieve the start of the transaction data
+def process_transaction(buffer, offset: int, coinbase: bool = False, drop_zero: bool = True,
+                        segments: Optional[list] = None) -> Tuple[RawTransaction, int]:
+    # segments: if given, the segments of the buffer to be hashed to get the id of the transaction are appended to
+    # it and the hash is left to the caller (tx_hash is None), see hash256_segments
+    byte_start = offset  # easily retrieve the start of the transaction data
     txos_in, txos_out = [], []
-    transaction_data = f.read(4)  # used to compute the hash of the transaction
-    byte_start_hash = f.tell()
-    num_txos_in = read_variable_length_integer(f)  # number of input UTXO
+    byte_start_hash = offset + 4  # skip the version
+    num_txos_in, offset = read_variable_length_integer(buffer, byte_start_hash)  # number of input UTXO
     witness_flag = num_txos_in == 0
     if witness_flag:
-        f.read(1)
-        byte_start_hash = f.tell()
-        num_txos_in = read_variable_length_integer(f)
+        byte_start_hash = offset + 1  # skip the flag
+        num_txos_in, offset = read_variable_length_integer(buffer, byte_start_hash)
     if coinbase:  # COINBASE
-        f.read(32)  # previous transaction is None
-        f.read(4)  # previous vout is None
-        size_script = read_variable_length_integer(f)
-        script = f.read(size_script)  # unlocking script
-        sequence = f.read(4)  # sequence
+        offset += 32 + 4  # previous transaction and previous vout are None
+        size_script, offset = read_variable_length_integer(buffer, offset)
+        script = buffer[offset: offset + size_script]  # unlocking script
+        offset += size_script
+        sequence = buffer[offset: offset + 4]  # sequence
+        offset += 4
         txos_in.append(RawInputTXO(tx_hash=b"", vout=-1, script=script if size_script > 0 else b"", witness=b"",
                                    sequence=sequence))
     else:
         for position_in in range(num_txos_in):
-            tx_hash = f.read(32)  # id of the transaction that has created the tx
-            tx_vout = int(internal_byte_order_to_hex(f.read(4)), 16)  # position in the output list
-            size_script = read_variable_length_integer(f)
-            script = f.read(size_script)
-            sequence = f.read(4)  # sequence
+            tx_hash = buffer[offset: offset + 32]  # id of the transaction that has created the tx
+            tx_vout = read_uint32(buffer, offset + 32)  # position in the output list
+            size_script, offset = read_variable_length_integer(buffer, offset + 36)
+            script = buffer[offset: offset + size_script]
+            offset += size_script
+            sequence = buffer[offset: offset + 4]  # sequence
+            offset += 4
             txos_in.append(RawInputTXO(tx_hash=tx_hash, vout=tx_vout, script=script if size_script > 0 else b"",
                                        witness=b"", sequence=sequence))
-    num_txos_out = read_variable_length_integer(f)  # number of output UTXO
+    num_txos_out, offset = read_variable_length_integer(buffer, offset)  # number of output UTXO
     for position_out in range(num_txos_out):
-        value = f.read(8)  # number of satoshis
-        script_size = read_variable_length_integer(f)
-        script = f.read(script_size)  # locking script
-        if not drop_zero or int(internal_byte_order_to_hex(value), 16) > 0:
+        value = buffer[offset: offset + 8]  # number of satoshis
+        keep = not drop_zero or read_uint64(buffer, offset) > 0
+        script_size, offset = read_variable_length_integer(buffer, offset + 8)
+        script = buffer[offset: offset + script_size]  # locking script
+        offset += script_size
+        if keep:
             txos_out.append(RawOutputTXO(vout=position_out, value=value, script=script))
-    byte_end_hash = f.tell()
-    f.seek(byte_start_hash)
-    transaction_data += f.read(byte_end_hash - byte_start_hash)
+    byte_end_hash = offset
     if witness_flag:
+        byte_start_witnesses, spans = offset, []
         for position_in in range(num_txos_in):
-            byte_start_witness = f.tell()
-            num_stack_items = read_variable_length_integer(f)
+            byte_start_witness = offset - byte_start_witnesses
+            num_stack_items, offset = read_variable_length_integer(buffer, offset)
             for _ in range(num_stack_items):
-                size = read_variable_length_integer(f)
-                witness_data = f.read(size)
-            byte_end_witness = f.tell()
-            f.seek(byte_start_witness)
-            witness_stack = f.read(byte_end_witness - byte_start_witness)
-            txos_in[position_in].update_witness(new_witness=witness_stack)  # add all witness data to the input
-    transaction_data += f.read(4)  # add the lock time to the data sequence to be hashed
-    transaction_hash = hash256(transaction_data)  # compute the hash of the transaction
-    return RawTransaction(tx_hash=transaction_hash, txos_in=txos_in, txos_out=txos_out)
-
-
-def process_block(f, drop_zero: bool = True) -> RawBlock:
-    byte_start = f.tell()
-    f.read(4)  # magic bytes
-    f.read(4)  # size
-    header = f.read(80)  # get the header of the block
+                size, offset = read_variable_length_integer(buffer, offset)
+                offset += size
+            spans.append((byte_start_witness, offset - byte_start_witnesses))
+        # the witnesses of all the inputs are sliced at once, each input only keeps its span, the stacks are decoded
+        # when they are needed (e.g. hidden_locking_script)
+        witnesses = buffer[byte_start_witnesses: offset]
+        for txo_in, (start, end) in zip(txos_in, spans):
+            txo_in.update_witness_span(buffer=witnesses, start=start, end=end)
+        # the witness data is not part of the data hashed to get the id of the transaction
+        transaction_segments = ((byte_start, byte_start + 4), (byte_start_hash, byte_end_hash), (offset, offset + 4))
+    else:
+        transaction_segments = ((byte_start, offset + 4),)
+    offset += 4  # lock time
+    if segments is not None:
+        segments.append(transaction_segments)
+        transaction_hash = None
+    else:
+        transaction_hash = hash256_segments(buffer, [transaction_segments])[0]  # compute the hash of the transaction
+    return RawTransaction(tx_hash=transaction_hash, txos_in=txos_in, txos_out=txos_out), offset
+
+
+def process_block(buffer, offset: int, drop_zero: bool = True, n_threads: int = 1) -> Tuple[RawBlock, int]:
+    # the ids of the transactions are computed at the end, in one batch
+    byte_start = offset
+    header = buffer[offset + 8: offset + 88]  # skip the magic bytes and the size, get the header of the block
     previous_block_hash = header[4:36]
     block_hash = hash256(header)
-    num_transactions = read_variable_length_integer(f)
-    transactions = []
+    num_transactions, offset = read_variable_length_integer(buffer, offset + 88)
+    transactions, segments = [], []
     for position in range(num_transactions):
-        transaction = process_transaction(f, coinbase=position == 0, drop_zero=drop_zero)
+        transaction, offset = process_transaction(buffer, offset, coinbase=position == 0, drop_zero=drop_zero,
+                                                  segments=segments)
         transactions.append(transaction)
-    byte_end = f.tell()
-    return RawBlock(hash=block_hash, previous_hash=previous_block_hash, byte_start=byte_start, byte_end=byte_end,
-                    transactions=transactions)
+    for transaction, transaction_hash in zip(transactions, hash256_segments(buffer, segments, n_threads=n_threads)):
+        transaction.update_tx_hash(tx_hash=transaction_hash)
+    return RawBlock(hash=block_hash, previous_hash=previous_block_hash, byte_start=byte_start, byte_end=offset,
+                    transactions=transactions), offset
+
+
+def process_block_header(buffer, offset: int) -> Tuple[RawBlockHeader, int]:
+    # only read the header and the number of transactions, then jump to the next block using the size of the block
+    byte_start = offset
+    size = read_uint32(buffer, offset + 4)
+    header = buffer[offset + 8: offset + 88]
+    num_transactions, _ = read_variable_length_integer(buffer, offset + 88)
+    byte_end = offset + 8 + size
+    # the previous hash is copied, a header kept aside by iter_chain must not keep the mapping of its file alive
+    return RawBlockHeader(hash=hash256(header), previous_hash=bytes(header[4:36]), byte_start=byte_start,
+                          byte_end=byte_end, num_transactions=num_transactions), byte_end
+
+
+def process_block_columns(buffer, offset: int, drop_zero: bool = True,
+                          n_threads: int = 1) -> Tuple[ColumnarBlock, int]:
+    # same as process_block, but the block is stored as arrays of offsets into a copy of its data
+    byte_start = offset
+    byte_end = offset + 8 + read_uint32(buffer, offset + 4)
+    data = bytes(buffer[byte_start: byte_end])
+    num_transactions, offset = read_variable_length_integer(data, 88)
+    tx_segments, tx_inputs, tx_outputs = [], [0], [0]
+    in_hash, in_vout, in_sequence, in_script_start, in_script_end, in_witness_start, in_witness_end = \
+        [], [], [], [], [], [], []
+    out_vout, out_value, out_script_start, out_script_end = [], [], [], []
+    for position in range(num_transactions):
+        tx_start = offset
+        byte_start_hash = offset + 4  # skip the version
+        num_txos_in, offset = read_variable_length_integer(data, byte_start_hash)
+        witness_flag = num_txos_in == 0
+        if witness_flag:
+            byte_start_hash = offset + 1  # skip the flag
+            num_txos_in, offset = read_variable_length_integer(data, byte_start_hash)
+        if position == 0:  # COINBASE, only the first input is read, as in process_transaction
+            num_txos_in = 1
+        for _ in range(num_txos_in):
+            in_hash.append(offset)
+            in_vout.append(read_uint32(data, offset + 32) if position > 0 else -1)
+            size_script, offset = read_variable_length_integer(data, offset + 36)
+            in_script_start.append(offset)
+            offset += size_script
+            in_script_end.append(offset)
+            in_sequence.append(read_uint32(data, offset))
+            offset += 4
+        num_txos_out, offset = read_variable_length_integer(data, offset)
+        for position_out in range(num_txos_out):
+            value = read_uint64(data, offset)
+            script_size, offset = read_variable_length_integer(data, offset + 8)
+            if not drop_zero or value > 0:
+                out_vout.append(position_out)
+                out_value.append(value)
+                out_script_start.append(offset)
+                out_script_end.append(offset + script_size)
+            offset += script_size
+        byte_end_hash = offset
+        for _ in range(num_txos_in):
+            in_witness_start.append(offset)
+            if witness_flag:
+                num_stack_items, offset = read_variable_length_integer(data, offset)
+                for _ in range(num_stack_items):
+                    size, offset = read_variable_length_integer(data, offset)
+                    offset += size
+            in_witness_end.append(offset)
+        if witness_flag:
+            tx_segments.append(((tx_start, tx_start + 4), (byte_start_hash, byte_end_hash), (offset, offset + 4)))
+        else:
+            tx_segments.append(((tx_start, offset + 4),))
+        offset += 4  # lock time
+        tx_inputs.append(len(in_vout))
+        tx_outputs.append(len(out_vout))
+    block = ColumnarBlock(data=data, hash=hash256(data[8:88]), byte_start=byte_start,
+                          tx_hash=np.frombuffer(b"".join(hash256_segments(data, tx_segments, n_threads=n_threads)),
+                                                dtype=np.uint8).reshape(-1, 32),
+                          tx_inputs=np.array(tx_inputs, dtype=np.int64),
+                          tx_outputs=np.array(tx_outputs, dtype=np.int64),
+                          input_tx_hash_start=np.array(in_hash, dtype=np.int64),
+                          input_vout=np.array(in_vout, dtype=np.int64),
+                          input_sequence=np.array(in_sequence, dtype=np.uint32),
+                          input_script_start=np.array(in_script_start, dtype=np.int64),
+                          input_script_end=np.array(in_script_end, dtype=np.int64),
+                          input_witness_start=np.array(in_witness_start, dtype=np.int64),
+                          input_witness_end=np.array(in_witness_end, dtype=np.int64),
+                          output_vout=np.array(out_vout, dtype=np.int64),
+                          output_value=np.array(out_value, dtype=np.int64),
+                          output_script_start=np.array(out_script_start, dtype=np.int64),
+                          output_script_end=np.array(out_script_end, dtype=np.int64))
+    if offset != len(data):  # the transactions do not fill the record
+        raise ValueError(f"{len(data)} bytes expected, {offset} parsed")
+    return block, byte_end
+
+
+def iter_blocks(file: str, folder: str, drop_zero: bool = True, zero_copy: bool = False, header_only: bool = False,
+                columnar: bool = False, magic: bytes = MAGIC,
+                n_threads: int = 1) -> Iterator[Union[RawBlock, RawBlockHeader, ColumnarBlock]]:
+    # yield the blocks of a file one at a time, only the current block is kept in memory
+    # header_only: yield the headers of the blocks, the transactions are skipped
+    # columnar: yield the blocks as ColumnarBlock
+    # n_threads: number of threads used to compute the ids of the transactions of a block
+    # the zero padding at the end of the preallocated files is skipped, and after a corrupted record the parsing
+    # resumes at the next magic bytes
+    num_file = file_number(file)
+    buffer = map_file(file, folder, zero_copy=zero_copy)
+    key = read_xor_key(folder)
+    if header_only:
+        parse, size = process_block_header, 88 + 9  # the header and the number of transactions (at most 9 bytes)
+    elif columnar:
+        parse, size = partial(process_block_columns, drop_zero=drop_zero, n_threads=n_threads), None
+    else:
+        parse, size = partial(process_block, drop_zero=drop_zero, n_threads=n_threads), None
+    offset = 0
+    try:
+        while len(buffer) - offset > 0:
+            if read_bytes(buffer, offset, offset + 4, key) != magic:
+                offset = find_magic(buffer, offset + 1, magic=magic, key=key)
+                if offset < 0:
+                    break
+            # the next record starts after the size given in the record, a block that is not exactly this size (e.g.
+            # a corrupted one that can be parsed past its end) is treated as a corrupted record
+            try:
+                next_offset = offset + 8 + read_uint32(read_bytes(buffer, offset + 4, offset + 8, key))
+                if next_offset > len(buffer):
+                    raise ValueError("the record ends after the end of the file")
+                block, end = read_record(parse, buffer, offset, key=key, zero_copy=zero_copy, size=size)
+                if not header_only and end != next_offset:
+                    raise ValueError(f"{next_offset - offset} bytes expected, {end - offset} parsed")
+            except (IndexError, ValueError, struct.error) as e:
+                warnings.warn(f"Corrupted block record in {file} at byte {offset} ({e.__class__.__name__}: {e}), "
+                              f"the parsing resumes at the next magic bytes")
+                offset += 4
+                continue
+            offset = next_offset
+            block.num_file = num_file
+            yield block
+    finally:
+        if not zero_copy and isinstance(buffer, mmap.mmap):
+            buffer.close()
 
 
-def process_file(file: str, folder: str, max_block: int = None, drop_zero: bool = True) -> List[RawBlock]:
+def process_file(file: str, folder: str, max_block: int = None, drop_zero: bool = True,
+                 zero_copy: bool = False) -> List[RawBlock]:
+    # zero_copy: hashes and scripts are memoryviews of the mapped file, they have to be copied (bytes(...)) by the
+    # callers that keep them, and the returned blocks cannot be pickled
     blocks = []
-    with open(os.path.join(folder, file), "rb") as f:
-        f.seek(0, 2)
-        file_size = f.tell()
-        f.seek(0, 0)
-        while file_size - f.tell() > 0:
-            block = process_block(f, drop_zero=drop_zero)
-            blocks.append(block)
-            if max_block is not None and len(blocks) >= max_block:
-                break
+    for block in iter_blocks(file, folder, drop_zero=drop_zero, zero_copy=zero_copy):
+        blocks.append(block)
+        if max_block is not None and len(blocks) >= max_block:
+            break
     return blocks
+
+
+def read_file_blocks(file: str, folder: str, locations: Iterable[Tuple[int, int]], drop_zero: bool = True,
+                     zero_copy: bool = False, columnar: bool = False,
+                     n_threads: int = 1) -> Iterator[Union[RawBlock, ColumnarBlock]]:
+    # yield the blocks of a file stored at the given locations (block_num, byte_start), without parsing the rest of
+    # the file, the blocks are read in the order of the file
+    num_file = file_number(file)
+    buffer = map_file(file, folder, zero_copy=zero_copy)
+    key = read_xor_key(folder)
+    if columnar:
+        parse = partial(process_block_columns, drop_zero=drop_zero, n_threads=n_threads)
+    else:
+        parse = partial(process_block, drop_zero=drop_zero, n_threads=n_threads)
+    try:
+        for block_num, byte_start in sorted(locations, key=lambda location: location[1]):
+            if read_bytes(buffer, byte_start, byte_start + 4, key) != MAGIC:
+                raise ValueError(f"No block at byte {byte_start} of {file} (block {block_num}), "
+                                 f"the index of the blocks does not match the blk files")
+            block, _ = read_record(parse, buffer, byte_start, key=key, zero_copy=zero_copy)
+            block.num_file = num_file
+            block.block_num = block_num
+            yield block
+    finally:
+        if not zero_copy and isinstance(buffer, mmap.mmap):
+            buffer.close()
+
+
+def read_blocks(folder: str, locations: Iterable[Tuple[int, int, int]], drop_zero: bool = True,
+                zero_copy: bool = False, columnar: bool = False,
+                n_threads: int = 1) -> Iterator[Union[RawBlock, ColumnarBlock]]:
+    # random access to the blocks from their locations (block_num, num_file, byte_start), as stored in the table of
+    # the blocks, each file is mapped once and only the requested blocks are parsed
+    # the blocks are yielded in the order of the files, then of the offsets, not in the order of the chain
+    file2locations: Dict[int, List[Tuple[int, int]]] = dict()
+    for block_num, num_file, byte_start in locations:
+        file2locations.setdefault(num_file, []).append((block_num, byte_start))
+    for num_file in sorted(file2locations):
+        yield from read_file_blocks(file_name(num_file), folder, file2locations[num_file], drop_zero=drop_zero,
+                                    zero_copy=zero_copy, columnar=columnar, n_threads=n_threads)
+
+
+def iter_chain(folder: str, start: int = -1, end: Optional[int] = None, prev_hash: Optional[bytes] = None,
+               drop_zero: bool = True, zero_copy: bool = False, header_only: bool = False,
+               columnar: bool = False,
+               max_pending_files: int = 32) -> Iterator[Union[RawBlock, RawBlockHeader, ColumnarBlock]]:
+    # yield the blocks start + 1, ..., end in the order of the chain, with their block number
+    # prev_hash: hash of the block start, if None the chain is followed from the genesis block
+    # header_only, columnar: see iter_blocks
+    # the blocks are stored out of order in the files, a block found before its parent is kept aside until the
+    # parent is found, so the memory only depends on how far the blocks are from their position in the chain
+    # max_pending_files: a block kept aside is dropped once that many files have been read after its own file and its
+    # parent has not been found, i.e. the orphan blocks and, when starting from prev_hash, the blocks at or below
+    # start (Bitcoin Core downloads at most 1024 blocks ahead of the chain, so a parent is never that far)
+    if prev_hash is None:
+        prev_hash, block_num = NULL_HASH, -1
+    else:
+        prev_hash, block_num = bytes(prev_hash), start
+    pending = dict()  # previous hash -> (block, index of its file)
+    for index_file, file in enumerate(list_block_files(folder)):
+        for block in iter_blocks(file, folder, drop_zero=drop_zero, zero_copy=zero_copy, header_only=header_only,
+                                 columnar=columnar):
+            pending[bytes(block.previous_hash)] = (block, index_file)
+            while prev_hash in pending:
+                if end is not None and block_num >= end:
+                    return
+                next_block, _ = pending.pop(prev_hash)
+                block_num += 1
+                next_block.block_num = block_num
+                prev_hash = next_block.hash
+                if block_num > start:
+                    yield next_block
+        for previous_hash in [previous_hash for previous_hash, (_, index_file_) in pending.items()
+                              if index_file - index_file_ >= max_pending_files]:
+            del pending[previous_hash]
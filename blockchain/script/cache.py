@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from typing import Callable
+
+
+entry_overhead = 100  # approximate memory used by an entry besides its key and its value, in bytes
+
+
+def value_size(value) -> int:
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    elif isinstance(value, tuple):
+        return sum(value_size(v) for v in value)
+    return 0
+
+
+class ScriptCache(object):  # LRU cache of the results of a function of a script, bounded by its size in bytes
+
+    def __init__(self, max_bytes: int = 1 << 26):
+
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # script -> (result, size), from the least to the most recently used
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, script: bytes, function: Callable):
+        # result of function(script), the function is called on a copy of the script, so the results never refer to
+        # the buffer of the script (e.g. a mapped blk file), the exceptions are not cached
+        key = bytes(script)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+        self.misses += 1
+        result = function(key)
+        size = len(key) + value_size(result) + entry_overhead
+        self.entries[key] = (result, size)
+        self.size += size
+        while self.size > self.max_bytes and len(self.entries) > 0:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+        return result
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        calls = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / calls if calls > 0 else 0.,
+                "entries": len(self.entries), "size": self.size}
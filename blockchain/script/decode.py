@@ -1,47 +1,59 @@
 
-import os
-import yaml
-import binascii
+from typing import List, Optional, Tuple
 
+from blockchain.integers import read_uint16, read_uint32, read_variable_length_integer
+from blockchain.script.opcodes import op_codes
 
-path_op_codes = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hex2tokens.yaml")
-dict_op_codes = yaml.load(open(path_op_codes, "r"), Loader=yaml.FullLoader)
 
+dict_op_codes = {byte: name for byte, name in enumerate(op_codes) if name is not None}
 
-def parse_script(script: bytes):
-    index, tokens = 0, []
-    while index < len(script):
-        next_hex = int(hex(script[index]), 16)
-        if 0x01 <= next_hex <= 0x4b:
-            assert len(script) >= index + 1 + next_hex
-            data = script[index+1: index+1+next_hex]
-            tokens.append(("data", data))
-            index += (1 + next_hex)
-        elif next_hex == 0x4c:
-            assert len(script) > index + 1
-            size = int(hex(script[index+1]), 16)
-            assert len(script) >= index + 1 + 1 + size
-            data = script[index+1+1: index+1+1+size]
-            tokens.append(("data", data))
-            index += (1 + 1 + size)
-        elif next_hex == 0x4d:
-            assert len(script) > index + 1 + 2
-            size = int(binascii.hexlify(script[index+1: index+1+2][::-1]), 16)
-            assert len(script) >= index + 1 + 2 + size
-            data = script[index+1+2: index+1+2+size]
-            tokens.append(("data", data))
-            index += (1 + 2 + size)
-        elif next_hex == 0x4e:
-            assert len(script) > index + 1 + 4
-            size = int(binascii.hexlify(script[index+1: index+1+4][::-1]), 16)
-            assert len(script) >= index + 1 + 2 + size
-            data = script[index+1+4: index+1+4+size]
-            tokens.append(("data", data))
-            index += (1 + 4 + size)
+
+DATA, OP = 0, 1  # kinds of the tokens
+op_bytes = tuple(bytes([byte]) for byte in range(256))  # the operators of the tokens, shared by all the scripts
+
+
+def tokenize_script(script: bytes) -> Tuple[List[int], List[int], List[int], List[int]]:
+    # the tokens as parallel lists (kind, opcode, start, end), where script[start:end] is the data pushed by a DATA
+    # token or the operator itself for an OP token, nothing is copied from the script
+    kinds, opcodes, starts, ends = [], [], [], []
+    index, size_script = 0, len(script)
+    while index < size_script:
+        opcode = script[index]
+        if 0x01 <= opcode <= 0x4b:
+            start, size = index + 1, opcode
+            assert size_script >= start + size
+        elif opcode == 0x4c:
+            assert size_script > index + 1
+            start, size = index + 2, script[index + 1]
+            assert size_script >= start + size
+        elif opcode == 0x4d:
+            assert size_script > index + 1 + 2
+            start, size = index + 3, read_uint16(script, index + 1)
+            assert size_script >= start + size
+        elif opcode == 0x4e:
+            assert size_script > index + 1 + 4
+            start, size = index + 5, read_uint32(script, index + 1)
+            assert size_script >= index + 1 + 2 + size
         else:
-            tokens.append(("op", script[index: index+1]))
+            kinds.append(OP)
+            opcodes.append(opcode)
+            starts.append(index)
+            ends.append(index + 1)
             index += 1
-    return tokens
+            continue
+        kinds.append(DATA)
+        opcodes.append(opcode)
+        starts.append(start)
+        ends.append(min(start + size, size_script))
+        index = start + size
+    return kinds, opcodes, starts, ends
+
+
+def parse_script(script: bytes):
+    # the tokens as tuples ("data", data) or ("op", operator)
+    kinds, opcodes, starts, ends = tokenize_script(script)
+    return [("data", script[start: end]) if kind == DATA else ("op", op_bytes[opcode])
+            for kind, opcode, start, end in zip(kinds, opcodes, starts, ends)]
 
 
 def decode_script(script: bytes = None, tokens: list = None, join: bool = False):
@@ -54,41 +66,33 @@ def decode_script(script: bytes = None, tokens: list = None, join: bool = False)
             except:
                 return "NON_HEX_DATA"
         else:
-            hex_x = int(hex(x[1][0]), 16)
-            return dict_op_codes.get(hex_x, f"OP_UNKNOWN_{hex_x}")
+            return op_codes[x[1][0]] or f"OP_UNKNOWN_{x[1][0]}"
 
     tokens = list(map(decode_, tokens))
     return " ".join(tokens) if join else tokens
 
 
-def read_variable_length_integer(script, current_position: int = 0):
-    int_ = int(script[current_position])
-    if int_ < 0xfd:
-        new_position = current_position + 1
-        return int_, new_position
-    elif int_ == 0xfd:
-        int_ = int(binascii.hexlify(script[current_position+1:current_position+1+2][::-1]), 16)
-        new_position = current_position + 1 + 2
-        return int_, new_position
-    elif int_ == 0xfe:
-        int_ = int(binascii.hexlify(script[current_position+1:current_position+1+4][::-1]), 16)
-        new_position = current_position + 1 + 4
-        return int_, new_position
-    elif int_ == 0xff:
-        int_ = int(binascii.hexlify(script[current_position+1:current_position+1+8][::-1]), 16)
-        new_position = current_position + 1 + 8
-        return int_, new_position
-    else:
-        raise ValueError
+def witness_top(witness) -> Optional[bytes]:
+    # last item of the stack of a witness, the other items are skipped without being sliced
+    if len(witness) == 0:
+        return None
+    num_elements, index = read_variable_length_integer(witness, 0)
+    if num_elements == 0:
+        return None
+    for _ in range(num_elements - 1):
+        size, index = read_variable_length_integer(witness, index)
+        index += size
+    size, index = read_variable_length_integer(witness, index)
+    return witness[index: index + size]
 
 
 def decode_witness(witness):
     if len(witness) == 0:
         return []
-    num_elements, index = read_variable_length_integer(witness, current_position=0)
+    num_elements, index = read_variable_length_integer(witness, 0)
     stack = []
     for _ in range(num_elements):
-        size, index = read_variable_length_integer(witness, current_position=index)
+        size, index = read_variable_length_integer(witness, index)
         data = witness[index: index + size]
         stack.append(data)
         index += size
@@ -0,0 +1,40 @@
+
+import os
+import yaml
+import argparse
+
+
+# hex2tokens.yaml is the source of the names of the operators, this script compiles it to opcodes.py, so that the
+# workers do not need PyYAML to decode the scripts
+# usage, after editing hex2tokens.yaml: python -m blockchain.script.generate_opcodes [--yaml PATH] [--output PATH]
+
+folder = os.path.dirname(os.path.abspath(__file__))
+path_yaml = os.path.join(folder, "hex2tokens.yaml")
+path_py = os.path.join(folder, "opcodes.py")
+
+
+def generate_opcodes(path: str = path_yaml) -> str:
+    with open(path, "r") as f:
+        dict_op_codes = yaml.load(f, Loader=yaml.FullLoader)
+    lines = ["# generated from hex2tokens.yaml by generate_opcodes.py, do not edit",
+             "",
+             "# name of each operator, indexed by its byte (None for the bytes that are not operators)",
+             "op_codes = ("]
+    for byte in range(256):
+        name = dict_op_codes.get(byte)
+        name = "None" if name is None else f'"{name}"'
+        lines.append(f"    {name},  # 0x{byte:02x}")
+    lines.append(")")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compile hex2tokens.yaml to opcodes.py")
+    parser.add_argument("--yaml", default=path_yaml, help="names of the operators, indexed by their byte")
+    parser.add_argument("--output", default=path_py, help="generated python module")
+    args = parser.parse_args()
+
+    with open(args.output, "w") as f:
+        f.write(generate_opcodes(path=args.yaml))
+    print(f"{args.output} has been generated")
@@ -1,9 +1,12 @@
 
-import re
-import binascii
+import numpy as np
+
+from functools import partial
+from typing import List, Optional, Tuple
 
 from blockchain.account import is_pk, is_pkh, is_compressed_pk, is_sh, is_wsh, is_trsh
-from blockchain.script.decode import parse_script, decode_witness
+from blockchain.script.decode import parse_script, tokenize_script, witness_top, DATA
+from blockchain.script.cache import ScriptCache
 from blockchain.hash_methods import hash160
 
 
@@ -43,40 +46,116 @@ def is_p2ms(tokens: list):
     return False
 
 
-def is_p2wpkh(tokens: list):
+def is_witness_program(tokens: list, version: bytes, strict: bool = False) -> bool:
+    # <version> <data>, by default the script is only rejected if both tokens are wrong (so any <token> <20 bytes> is
+    # a P2WPKH, any <token> <32 bytes> a P2WSH and no script a P2TR), as in the existing databases
+    # strict: both tokens must match, this changes the stored types (see README)
+    mismatches = ((tokens[0] != ("op", version)), (tokens[1][0] != "data"))
+    return not (any(mismatches) if strict else all(mismatches))
+
+
+def is_p2wpkh(tokens: list, strict: bool = False):
     if len(tokens) != 2:
         return False
-    if (tokens[0] != ("op", b"\x00")) and (tokens[1][0] != "data"):
+    if not is_witness_program(tokens, b"\x00", strict=strict):
         return False
     return is_pkh(tokens[1][1])
 
 
-def is_p2wsh(tokens: list):
+def is_p2wsh(tokens: list, strict: bool = False):
     if len(tokens) != 2:
         return False
-    if (tokens[0] != ("op", b"\x00")) and (tokens[1][0] != "data"):
+    if not is_witness_program(tokens, b"\x00", strict=strict):
         return False
     return is_wsh(tokens[1][1])
 
 
-def is_p2taproot(tokens: list):
+def is_p2taproot(tokens: list, strict: bool = False):
     if len(tokens) != 2:
         return False
-    if (tokens[0] != ("op", b"\x51")) and (tokens[1][0] != "data"):
+    if not is_witness_program(tokens, b"\x51", strict=strict):
         return False
     return is_trsh(tokens[1][1])
 
 
-dersig = "30[0-9a-f]{2}[0-9a-f]+02[0-9a-f]+(01|02|03|81|82|83)"
+sighash_types = (0x01, 0x02, 0x03, 0x81, 0x82, 0x83)
 
 
 def is_signature(data: bytes) -> bool:
-    data_str = binascii.hexlify(data).decode("utf-8")
-    return not(re.fullmatch(dersig, data_str) is None)
+    # DER signature followed by the sighash type: 0x30 <size> 0x02 <size r> <r> 0x02 <size s> <s> <sighash>
+    size = len(data)
+    if size < 9 or size > 73 or data[0] != 0x30 or data[1] != size - 3 or data[2] != 0x02:
+        return False
+    size_r = data[3]
+    if size_r == 0 or 5 + size_r >= size or data[4 + size_r] != 0x02:
+        return False
+    size_s = data[5 + size_r]
+    return size_s > 0 and size_r + size_s + 7 == size and data[size - 1] in sighash_types
+
+
+def are_signatures(buffer: bytes, offsets: np.ndarray) -> np.ndarray:
+    # batch version of is_signature, for the data buffer[offsets[i]:offsets[i+1]]
+    starts, sizes = offsets[:-1], np.diff(offsets)
+    data = np.concatenate([np.frombuffer(buffer, dtype=np.uint8), np.zeros(80, dtype=np.uint8)])
+    size_r = data[starts + 3].astype(np.int64)
+    valid = ((sizes >= 9) & (sizes <= 73) & (data[starts] == 0x30) & (data[starts + 1] == sizes - 3)
+             & (data[starts + 2] == 0x02) & (size_r > 0) & (5 + size_r < sizes))
+    size_r[~valid] = 0  # the next bytes are read inside the data
+    size_s = data[starts + 5 + size_r].astype(np.int64)
+    valid &= (data[starts + 4 + size_r] == 0x02) & (size_s > 0) & (size_r + size_s + 7 == sizes)
+    valid &= np.isin(data[np.maximum(starts + sizes - 1, 0)], sighash_types)
+    return valid
+
+
+def match_standard_script(script: bytes, strict: bool = False) -> Optional[Tuple[int, bytes]]:
+    # type and owner of the standard scripts, from their size and their fixed bytes only, without parsing them
+    # the result is the same as with the tokens (see match_owner_script), None for the other scripts
+    # the P2TR scripts have the type 4 (P2WSH), 5 if strict (see is_witness_program)
+    size = len(script)
+    if size == 25:  # OP_DUP OP_HASH160 <20 bytes> OP_EQUALVERIFY OP_CHECKSIG
+        if script[:3] == b"\x76\xa9\x14" and script[23:] == b"\x88\xac":
+            return 1, script[3:23]
+    elif size == 23:  # OP_HASH160 <20 bytes> OP_EQUAL
+        if script[:2] == b"\xa9\x14" and script[22] == 0x87:
+            return 2, script[2:22]
+    elif size == 22:  # OP_0 <20 bytes>
+        if script[:2] == b"\x00\x14":
+            return 3, script[2:]
+    elif size == 34:  # OP_0 <32 bytes> or OP_1 <32 bytes>
+        if script[:2] == b"\x00\x20":
+            return 4, script[2:]
+        elif script[:2] == b"\x51\x20":
+            return 5 if strict else 4, script[2:]
+    elif size == 67:  # <uncompressed public key> OP_CHECKSIG
+        if script[:2] == b"\x41\x04" and script[66] == 0xac:
+            return 0, hash160(script[1:66])
+    elif size == 35:  # <compressed public key> OP_CHECKSIG
+        if script[0] == 0x21 and (script[1] == 0x02 or script[1] == 0x03) and script[34] == 0xac:
+            return 0, hash160(script[1:34])
+    return None
+
+
+# the non-standard scripts (multisig templates, OP_RETURN prefixes, redeem scripts...) are often repeated, the
+# results of their analysis are cached in each process
+owner_cache = ScriptCache(max_bytes=1 << 26)
+strict_owner_cache = ScriptCache(max_bytes=1 << 26)  # the owners with the strict templates, see match_owner_script
+hidden_script_cache = ScriptCache(max_bytes=1 << 26)
+
+
+def script_cache_stats() -> dict:
+    return {"owner": owner_cache.stats(), "strict_owner": strict_owner_cache.stats(),
+            "hidden_script": hidden_script_cache.stats()}
+
+
+script_types = ("p2pk", "p2pkh", "p2sh", "p2wpkh", "p2wsh", "p2taproot")  # names of the types 0 to 5
 
 
 def match_script(script: bytes = None, tokens: list = None):
-    tokens = parse_script(script) if tokens is None else tokens
+    if tokens is None:
+        match = match_standard_script(script)
+        if match is not None:
+            return script_types[match[0]]
+        tokens = parse_script(script)
     if is_p2pk(tokens):
         return "p2pk"
     elif is_p2pkh(tokens):
@@ -95,7 +174,21 @@ def match_script(script: bytes = None, tokens: list = None):
         return "unknown"
 
 
-def match_owner_script(script: bytes = None, tokens: list = None):
+def match_owner_script(script: bytes = None, tokens: list = None, strict: bool = False):
+    # type and owner of a locking script
+    # strict: the P2WPKH, P2WSH and P2TR templates must be fully matched (see is_witness_program), the P2TR scripts
+    # then have the type 5 instead of 4, and the other <token> <20 bytes> or <token> <32 bytes> scripts the type 6
+    if tokens is None:  # the standard scripts are matched without parsing them, the other ones are cached
+        match = match_standard_script(script, strict=strict)
+        if match is not None:
+            return match
+        if strict:
+            return strict_owner_cache.get(script, partial(match_owner_tokens, strict=True))
+        return owner_cache.get(script, match_owner_tokens)
+    return match_owner_tokens(script=script, tokens=tokens, strict=strict)
+
+
+def match_owner_tokens(script: bytes, tokens: list = None, strict: bool = False):
     tokens = parse_script(script) if tokens is None else tokens
     if is_p2pk(tokens):
         pk = tokens[0][1]
@@ -105,44 +198,106 @@ def match_owner_script(script: bytes = None, tokens: list = None):
         return 1, tokens[2][1]
     elif is_p2sh(tokens):
         return 2, tokens[1][1]
-    elif is_p2wpkh(tokens):
+    elif is_p2wpkh(tokens, strict=strict):
         return 3, tokens[1][1]
-    elif is_p2wsh(tokens):
+    elif is_p2wsh(tokens, strict=strict):
         return 4, tokens[1][1]
-    elif is_p2taproot(tokens):
+    elif is_p2taproot(tokens, strict=strict):
         return 5, tokens[1][1]
     else:
         sh = hash160(script)
         return 6, sh
 
 
-def detect_script_in_unlocking(script: bytes = None, tokens: list = None):
-    tokens = parse_script(script) if tokens is None else tokens
-    if (len(tokens) == 0) or (tokens[-1][0] != "data"):
-        return None
-    locking_script = tokens[-1][1]
-    if is_pk(locking_script) or is_compressed_pk(locking_script):
-        return None
-    if is_signature(locking_script):
-        return None
+# the standard templates matched in batch: type, size, fixed bytes (position, value), start and size of the owner
+standard_templates = ((1, 25, ((0, 0x76), (1, 0xa9), (2, 0x14), (23, 0x88), (24, 0xac)), 3, 20),
+                      (2, 23, ((0, 0xa9), (1, 0x14), (22, 0x87)), 2, 20),
+                      (3, 22, ((0, 0x00), (1, 0x14)), 2, 20),
+                      (4, 34, ((0, 0x00), (1, 0x20)), 2, 32),
+                      (5, 34, ((0, 0x51), (1, 0x20)), 2, 32))
+
+
+def match_owner_scripts(buffer: bytes, offsets: np.ndarray,
+                        strict: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # batch version of match_owner_script, for the scripts buffer[offsets[i]:offsets[i+1]] (e.g. all the outputs of
+    # a block), return the types (-1 if the script cannot be decoded), the owners as a (num_scripts, 32) matrix
+    # padded with zeros, and the sizes of the owners
+    # the standard templates are matched with array operations, the other scripts go through match_owner_script
+    starts, sizes = offsets[:-1], np.diff(offsets)
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    data = np.concatenate([data, np.zeros(67, dtype=np.uint8)])  # the fixed bytes can be read past the last script
+    tps = np.full(len(starts), -1, dtype=np.int16)
+    owners = np.zeros((len(starts), 32), dtype=np.uint8)
+    owner_sizes = np.zeros(len(starts), dtype=np.int8)
+    for tp, size, fixed, owner_start, owner_size in standard_templates:
+        tp = 4 if tp == 5 and not strict else tp
+        index = np.flatnonzero(sizes == size)
+        for position, value in fixed:
+            index = index[data[starts[index] + position] == value]
+        tps[index] = tp
+        owners[index, :owner_size] = data[starts[index].reshape(-1, 1) + owner_start + np.arange(owner_size)]
+        owner_sizes[index] = owner_size
+    for i in np.flatnonzero(tps < 0).tolist():
+        try:
+            tp, owner = match_owner_script(script=buffer[offsets[i]: offsets[i + 1]], strict=strict)
+        except Exception:
+            continue
+        tps[i] = tp
+        owners[i, :len(owner)] = np.frombuffer(owner, dtype=np.uint8)
+        owner_sizes[i] = len(owner)
+    return tps, owners, owner_sizes
+
+
+def is_hidden_locking_script(data: bytes) -> bool:
+    # the last data of an unlocking script or of a witness is a locking script if it is neither a public key nor a
+    # signature, and if it can be parsed
+    if is_pk(data) or is_compressed_pk(data):
+        return False
+    if is_signature(data):
+        return False
     try:
-        parse_script(locking_script)
-        return locking_script
+        tokenize_script(data)
+        return True
     except:
-        return None
+        return False
+
+
+def detect_script_in_unlocking(script: bytes = None, tokens: list = None):
+    # the unlocking scripts are almost all different (they contain signatures), but not the scripts they reveal, so
+    # the cache is keyed by the candidate locking script
+    if tokens is None:  # only the last token is needed
+        kinds, _, starts, ends = tokenize_script(script)
+        if (len(kinds) == 0) or (kinds[-1] != DATA):
+            return None
+        locking_script = script[starts[-1]: ends[-1]]
+    else:
+        if (len(tokens) == 0) or (tokens[-1][0] != "data"):
+            return None
+        locking_script = tokens[-1][1]
+    return locking_script if hidden_script_cache.get(locking_script, is_hidden_locking_script) else None
 
 
 def detect_script_in_witness(witness: bytes):
-    witness_decoded = decode_witness(witness)
-    if len(witness_decoded) == 0:
-        return None
-    locking_script = witness_decoded[-1]
-    if is_pk(locking_script) or is_compressed_pk(locking_script):
-        return None
-    if is_signature(locking_script):
-        return None
-    try:
-        parse_script(locking_script)
-        return locking_script
-    except:
+    locking_script = witness_top(witness)
+    if locking_script is None:
         return None
+    return locking_script if hidden_script_cache.get(locking_script, is_hidden_locking_script) else None
+
+
+def detect_scripts_in_witnesses(witnesses: List[bytes]) -> List[Optional[bytes]]:
+    # batch version of detect_script_in_witness, e.g. for all the inputs of a block, the public keys and the
+    # signatures at the top of the stacks are discarded with array operations
+    tops = [witness_top(witness) for witness in witnesses]
+    index = [i for i, top in enumerate(tops) if top is not None]
+    if len(index) == 0:
+        return tops
+    offsets = np.zeros(len(index) + 1, dtype=np.int64)
+    np.cumsum([len(tops[i]) for i in index], out=offsets[1:])
+    buffer = b"".join([tops[i] for i in index])
+    sizes, first = np.diff(offsets), np.frombuffer(buffer + b"\x00", dtype=np.uint8)[offsets[:-1]]
+    is_key = ((sizes == 65) & (first == 0x04)) | ((sizes == 33) & ((first == 0x02) | (first == 0x03)))
+    candidate = ~(is_key | are_signatures(buffer, offsets))
+    for i, keep in zip(index, candidate.tolist()):
+        if not keep or not hidden_script_cache.get(tops[i], is_hidden_locking_script):
+            tops[i] = None
+    return tops
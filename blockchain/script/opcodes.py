@@ -0,0 +1,261 @@
+# generated from hex2tokens.yaml by generate_opcodes.py, do not edit
+
+# name of each operator, indexed by its byte (None for the bytes that are not operators)
+op_codes = (
+    "OP_0",  # 0x00
+    None,  # 0x01
+    None,  # 0x02
+    None,  # 0x03
+    None,  # 0x04
+    None,  # 0x05
+    None,  # 0x06
+    None,  # 0x07
+    None,  # 0x08
+    None,  # 0x09
+    None,  # 0x0a
+    None,  # 0x0b
+    None,  # 0x0c
+    None,  # 0x0d
+    None,  # 0x0e
+    None,  # 0x0f
+    None,  # 0x10
+    None,  # 0x11
+    None,  # 0x12
+    None,  # 0x13
+    None,  # 0x14
+    None,  # 0x15
+    None,  # 0x16
+    None,  # 0x17
+    None,  # 0x18
+    None,  # 0x19
+    None,  # 0x1a
+    None,  # 0x1b
+    None,  # 0x1c
+    None,  # 0x1d
+    None,  # 0x1e
+    None,  # 0x1f
+    None,  # 0x20
+    None,  # 0x21
+    None,  # 0x22
+    None,  # 0x23
+    None,  # 0x24
+    None,  # 0x25
+    None,  # 0x26
+    None,  # 0x27
+    None,  # 0x28
+    None,  # 0x29
+    None,  # 0x2a
+    None,  # 0x2b
+    None,  # 0x2c
+    None,  # 0x2d
+    None,  # 0x2e
+    None,  # 0x2f
+    None,  # 0x30
+    None,  # 0x31
+    None,  # 0x32
+    None,  # 0x33
+    None,  # 0x34
+    None,  # 0x35
+    None,  # 0x36
+    None,  # 0x37
+    None,  # 0x38
+    None,  # 0x39
+    None,  # 0x3a
+    None,  # 0x3b
+    None,  # 0x3c
+    None,  # 0x3d
+    None,  # 0x3e
+    None,  # 0x3f
+    None,  # 0x40
+    None,  # 0x41
+    None,  # 0x42
+    None,  # 0x43
+    None,  # 0x44
+    None,  # 0x45
+    None,  # 0x46
+    None,  # 0x47
+    None,  # 0x48
+    None,  # 0x49
+    None,  # 0x4a
+    None,  # 0x4b
+    None,  # 0x4c
+    None,  # 0x4d
+    None,  # 0x4e
+    "OP_1NEGATE",  # 0x4f
+    "OP_RESERVED",  # 0x50
+    "OP_1",  # 0x51
+    "OP_2",  # 0x52
+    "OP_3",  # 0x53
+    "OP_4",  # 0x54
+    "OP_5",  # 0x55
+    "OP_6",  # 0x56
+    "OP_7",  # 0x57
+    "OP_8",  # 0x58
+    "OP_9",  # 0x59
+    "OP_10",  # 0x5a
+    "OP_11",  # 0x5b
+    "OP_12",  # 0x5c
+    "OP_13",  # 0x5d
+    "OP_14",  # 0x5e
+    "OP_15",  # 0x5f
+    "OP_16",  # 0x60
+    "OP_NOP",  # 0x61
+    "OP_VER",  # 0x62
+    "OP_IF",  # 0x63
+    "OP_NOTIF",  # 0x64
+    "OP_VERIF",  # 0x65
+    "OP_VERNOTIF",  # 0x66
+    "OP_ELSE",  # 0x67
+    "OP_ENDIF",  # 0x68
+    "OP_VERIFY",  # 0x69
+    "OP_RETURN",  # 0x6a
+    "OP_TOALTSTACK",  # 0x6b
+    "OP_FROMALTSTACK",  # 0x6c
+    "OP_2DROP",  # 0x6d
+    "OP_2DUP",  # 0x6e
+    "OP_3DUP",  # 0x6f
+    "OP_2OVER",  # 0x70
+    "OP_2ROT",  # 0x71
+    "OP_2SWAP",  # 0x72
+    "OP_IFDUP",  # 0x73
+    "OP_DEPTH",  # 0x74
+    "OP_DROP",  # 0x75
+    "OP_DUP",  # 0x76
+    "OP_NIP",  # 0x77
+    "OP_OVER",  # 0x78
+    "OP_PICK",  # 0x79
+    "OP_ROLL",  # 0x7a
+    "OP_ROT",  # 0x7b
+    "OP_SWAP",  # 0x7c
+    "OP_TUCK",  # 0x7d
+    "OP_CAT",  # 0x7e
+    "OP_SPLIT",  # 0x7f
+    "OP_NUM2BIN",  # 0x80
+    "0P_BIN2NUM",  # 0x81
+    "OP_SIZE",  # 0x82
+    "OP_INVERT",  # 0x83
+    "OP_AND",  # 0x84
+    "OP_OR",  # 0x85
+    "OP_XOR",  # 0x86
+    "OP_EQUAL",  # 0x87
+    "OP_EQUALVERIFY",  # 0x88
+    "OP_RESERVED1",  # 0x89
+    "OP_RESERVED2",  # 0x8a
+    "OP_1ADD",  # 0x8b
+    "OP_1SUB",  # 0x8c
+    "OP_2MUL",  # 0x8d
+    "OP_2DIV",  # 0x8e
+    "OP_NEGATE",  # 0x8f
+    "OP_ABS",  # 0x90
+    "OP_NOT",  # 0x91
+    "OP_0NOTEQUAL",  # 0x92
+    "OP_ADD",  # 0x93
+    "OP_SUB",  # 0x94
+    "OP_MUL",  # 0x95
+    "OP_DIV",  # 0x96
+    "OP_MOD",  # 0x97
+    "OP_LSHIFT",  # 0x98
+    "OP_RSHIFT",  # 0x99
+    "OP_BOOLAND",  # 0x9a
+    "OP_BOOLOR",  # 0x9b
+    "OP_NUMEQUAL",  # 0x9c
+    "OP_NUMEQUALVERIFY",  # 0x9d
+    "OP_NUMNOTEQUAL",  # 0x9e
+    "OP_LESSTHAN",  # 0x9f
+    "OP_GREATERTHAN",  # 0xa0
+    "OP_LESSTHANOREQUAL",  # 0xa1
+    "OP_GREATERTHANOREQUAL",  # 0xa2
+    "OP_MIN",  # 0xa3
+    "OP_MAX",  # 0xa4
+    "OP_WITHIN",  # 0xa5
+    "OP_RIPEMD160",  # 0xa6
+    "OP_SHA1",  # 0xa7
+    "OP_SHA256",  # 0xa8
+    "OP_HASH160",  # 0xa9
+    "OP_HASH256",  # 0xaa
+    "OP_CODESEPARATOR",  # 0xab
+    "OP_CHECKSIG",  # 0xac
+    "OP_CHECKSIGVERIFY",  # 0xad
+    "OP_CHECKMULTISIG",  # 0xae
+    "OP_CHECKMULTISIGVERIFY",  # 0xaf
+    "OP_NOP1",  # 0xb0
+    "OP_NOP2",  # 0xb1
+    "OP_NOP3",  # 0xb2
+    "OP_NOP4",  # 0xb3
+    "OP_NOP5",  # 0xb4
+    "OP_NOP6",  # 0xb5
+    "OP_NOP7",  # 0xb6
+    "OP_NOP8",  # 0xb7
+    "OP_NOP9",  # 0xb8
+    "OP_NOP10",  # 0xb9
+    None,  # 0xba
+    None,  # 0xbb
+    None,  # 0xbc
+    None,  # 0xbd
+    None,  # 0xbe
+    None,  # 0xbf
+    None,  # 0xc0
+    None,  # 0xc1
+    None,  # 0xc2
+    None,  # 0xc3
+    None,  # 0xc4
+    None,  # 0xc5
+    None,  # 0xc6
+    None,  # 0xc7
+    None,  # 0xc8
+    None,  # 0xc9
+    None,  # 0xca
+    None,  # 0xcb
+    None,  # 0xcc
+    None,  # 0xcd
+    None,  # 0xce
+    None,  # 0xcf
+    None,  # 0xd0
+    None,  # 0xd1
+    None,  # 0xd2
+    None,  # 0xd3
+    None,  # 0xd4
+    None,  # 0xd5
+    None,  # 0xd6
+    None,  # 0xd7
+    None,  # 0xd8
+    None,  # 0xd9
+    None,  # 0xda
+    None,  # 0xdb
+    None,  # 0xdc
+    None,  # 0xdd
+    None,  # 0xde
+    None,  # 0xdf
+    None,  # 0xe0
+    None,  # 0xe1
+    None,  # 0xe2
+    None,  # 0xe3
+    None,  # 0xe4
+    None,  # 0xe5
+    None,  # 0xe6
+    None,  # 0xe7
+    None,  # 0xe8
+    None,  # 0xe9
+    None,  # 0xea
+    None,  # 0xeb
+    None,  # 0xec
+    None,  # 0xed
+    None,  # 0xee
+    None,  # 0xef
+    None,  # 0xf0
+    None,  # 0xf1
+    None,  # 0xf2
+    None,  # 0xf3
+    None,  # 0xf4
+    None,  # 0xf5
+    None,  # 0xf6
+    None,  # 0xf7
+    None,  # 0xf8
+    None,  # 0xf9
+    "OP_SMALL_INTEGER",  # 0xfa
+    None,  # 0xfb
+    None,  # 0xfc
+    "OP_PUBKEYHASH",  # 0xfd
+    "OP_PUBKEY",  # 0xfe
+    "OP_INVALIDOPCODE",  # 0xff
+)
@@ -1,6 +1,6 @@
 
 from blockchain.account import is_pk, is_compressed_pk
-from blockchain.script.decode import dict_op_codes
+from blockchain.script.opcodes import op_codes
 
 
 checksig_op = {b"\xac", b"\xad", b"\xae", b"\xaf"}  # operators that check whether the input signatures are valid
@@ -50,7 +50,7 @@ def not_spendable(tokens: list):
         if b"\x68" not in tokens_op:
             return False
     for token in tokens_op:
-        if not(int(hex(token[0]), 16) in dict_op_codes):
+        if op_codes[token[0]] is None:
             return True
     return False
 
@@ -1,65 +1,108 @@
 
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
 from blockchain.models.raw_transaction import RawTransaction
-from blockchain.script.decode import parse_script
-from blockchain.script.match import match_owner_script
-from blockchain.account import to_address
-from blockchain.read_binary_files import internal_byte_order_to_hex
+from blockchain.script.decode import tokenize_script, DATA
+from blockchain.special_transactions.watched_addresses import WatchedAddresses
+from blockchain.integers import read_uint32
 
 
-def is_open_asset_protocol(transaction: RawTransaction) -> bool:
+def tokenize_op_return(script: bytes) -> Optional[Tuple[list, list, list, list]]:
+    # tokens of an OP_RETURN script (see tokenize_script), None for the other scripts and the invalid ones
+    if len(script) == 0 or script[0] != 0x6a:
+        return None
+    try:
+        return tokenize_script(script=script)
+    except:
+        return None
+
+
+def is_open_asset_output(script: bytes, tokens: tuple, first: bool) -> bool:
+    # the marker output is the first OP_RETURN output, its first pushed data starts with OA
+    if not first:
+        return False
+    kinds, _, starts, ends = tokens
+    for kind, start, end in zip(kinds[1:], starts[1:], ends[1:]):
+        if kind == DATA:
+            return script[start: min(start + 2, end)] == b"OA"
+    return False
+
+
+def is_omnilayer_class_c_output(script: bytes, tokens: tuple, first: bool) -> bool:
+    # OP_RETURN directly followed by data starting with omni
+    kinds, _, starts, ends = tokens
+    return len(kinds) > 1 and kinds[1] == DATA and script[starts[1]: min(starts[1] + 4, ends[1])] == b"omni"
+
+
+def is_op_return_protocol(transaction: RawTransaction, rule: Callable[[bytes, tuple, bool], bool]) -> bool:
+    first = True
     for tx_out in transaction.txos_out:
-        script = tx_out.script
-        try:
-            tokens = parse_script(script=script)
-        except:
-            continue
-        if len(tokens) == 0:
-            continue
-        if int(hex(tokens[0][1][0]), 16) == 0x6a:
-            for tp, data in tokens[1:]:
-                if tp == "data":
-                    if data[:2] == b"OA":
-                        return True
-                    break
-            return False
+        tokens = tokenize_op_return(tx_out.script)
+        if tokens is not None:
+            if rule(tx_out.script, tokens, first):
+                return True
+            first = False
     return False
 
 
+def is_open_asset_protocol(transaction: RawTransaction) -> bool:
+    return is_op_return_protocol(transaction, rule=is_open_asset_output)
+
+
 def is_epobc_protocol(transaction: RawTransaction) -> bool:
     """Example: 354324 855"""
     if len(transaction.txos_in) == 0:
         return False
     first_tx_in = transaction.txos_in[0]
     sequence_number = first_tx_in.sequence
-    sequence_number = int(internal_byte_order_to_hex(sequence_number), 16)
+    sequence_number = read_uint32(sequence_number)
     tag = sequence_number & 0x3f
     if tag == 0x25 or tag == 0x33:
         return True
     return False
 
 
+omnilayer_exodus = WatchedAddresses(["1EXoDusjGwvnjZUyKkxZ4UHEf77z6A5S4P"])
+
+
 def is_omnilayer_class_a_b(transaction: RawTransaction) -> bool:
     """1EXoDusjGwvnjZUyKkxZ4UHEf77z6A5S4P"""
-    for tx_out in transaction.txos_out:
-        try:
-            tp, owner = match_owner_script(script=tx_out.script)
-            address = to_address(data=owner, tp=tp)
-        except:
-            continue
-        if address == "1EXoDusjGwvnjZUyKkxZ4UHEf77z6A5S4P":
-            return True
-    return False
+    return any(omnilayer_exodus.match_owner(tx_out.script) is not None for tx_out in transaction.txos_out)
 
 
 def is_omnilayer_class_c(transaction: RawTransaction) -> bool:
+    return is_op_return_protocol(transaction, rule=is_omnilayer_class_c_output)
+
+
+# registry of the detected protocols, the names are the columns of the table of the colored coins (see ColoredCoin)
+# protocols identified by an OP_RETURN output: rule(script, tokens, first), first is True for the first OP_RETURN
+# output of the transaction
+op_return_protocols: Dict[str, Callable[[bytes, tuple, bool], bool]] = {"oa": is_open_asset_output,
+                                                                       "ol_c": is_omnilayer_class_c_output}
+# protocols identified by the addresses that receive an output (owner of any script, see WatchedAddresses.match_owner)
+address_protocols: Dict[str, WatchedAddresses] = {"ol_ab": omnilayer_exodus}
+# protocols identified by a test of the whole transaction
+transaction_protocols: Dict[str, Callable[[RawTransaction], bool]] = {"epobc": is_epobc_protocol}
+
+
+def registered_protocols() -> List[str]:
+    return list(op_return_protocols) + list(address_protocols) + list(transaction_protocols)
+
+
+def detect_protocols(transaction: RawTransaction) -> Set[str]:
+    # all the registered protocols in a single pass, each output script is inspected once, the result is the same as
+    # with the is_..._protocol functions
+    protocols = {name for name, rule in transaction_protocols.items() if rule(transaction)}
+    first = True
     for tx_out in transaction.txos_out:
         script = tx_out.script
-        try:
-            tokens = parse_script(script=script)
-        except:
-            continue
-        if len(tokens) < 2:
-            continue
-        if int(hex(tokens[0][1][0]), 16) == 0x6a and tokens[1][0] == "data" and tokens[1][1][:4] == b"omni":
-            return True
-    return False
+        tokens = tokenize_op_return(script)
+        if tokens is not None:
+            for name, rule in op_return_protocols.items():
+                if rule(script, tokens, first):
+                    protocols.add(name)
+            first = False
+        for name, watched_addresses in address_protocols.items():
+            if watched_addresses.match_owner(script) is not None:
+                protocols.add(name)
+    return protocols
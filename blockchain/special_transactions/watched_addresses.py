@@ -0,0 +1,77 @@
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from blockchain.account import from_address
+from blockchain.models.raw_transaction import RawTransaction
+from blockchain.hash_methods import hash160
+from blockchain.script.match import match_owner_script
+
+
+# the types that share the same addresses, e.g. the owner of a P2PK script is the hash of the public key, and its
+# address is the one of the P2PKH script of this hash
+address_kinds = {0: "pkh", 1: "pkh", 2: "sh", 6: "sh", 3: "wpkh", 4: "wsh", 5: "tr"}
+
+
+def standard_script(tp: int, data: bytes) -> bytes:
+    # locking script of an address
+    if tp == 1:
+        return b"\x76\xa9\x14" + data + b"\x88\xac"
+    elif tp == 2:
+        return b"\xa9\x14" + data + b"\x87"
+    elif tp == 3:
+        return b"\x00\x14" + data
+    elif tp == 4:
+        return b"\x00\x20" + data
+    elif tp == 5:
+        return b"\x51\x20" + data
+    raise ValueError
+
+
+class WatchedAddresses(object):  # set of addresses (e.g. of services) matched against the locking scripts
+
+    def __init__(self, addresses: Iterable[str]):
+
+        self.owners: Dict[Tuple[str, bytes], str] = dict()  # (kind, hash) -> address
+        self.scripts: Dict[bytes, str] = dict()  # standard locking script -> address
+        for address in addresses:
+            tp, data = from_address(address)
+            self.owners[(address_kinds[tp], data)] = address
+            self.scripts[standard_script(tp, data)] = address
+        self.has_pkh = any(kind == "pkh" for kind, _ in self.owners)
+        self.only_pkh = all(kind == "pkh" for kind, _ in self.owners)
+
+    def __len__(self):
+        return len(self.owners)
+
+    def match(self, script: bytes) -> Optional[str]:
+        # the standard scripts are found with a single lookup, the only other scripts that can pay a watched address
+        # are the P2PK scripts (<public key> OP_CHECKSIG), whose owner is the hash of the public key
+        script = bytes(script)
+        address = self.scripts.get(script)
+        if address is not None or not self.has_pkh:
+            return address
+        if (len(script) == 35 and script[0] == 0x21 or len(script) == 67 and script[0] == 0x41) and script[-1] == 0xac:
+            return self.owners.get(("pkh", hash160(script[1:-1])))
+        return None
+
+    def match_owner(self, script: bytes) -> Optional[str]:
+        # same as match, but for any script whose owner (see match_owner_script) is watched, e.g. a P2PKH script that
+        # pushes the hash with OP_PUSHDATA1, the other scripts are classified unless they cannot pay a P2PKH address
+        # (all the P2PK and P2PKH scripts end with OP_CHECKSIG)
+        script = bytes(script)
+        address = self.match(script)
+        if address is not None or (self.only_pkh and script[-1:] != b"\xac"):
+            return address
+        try:
+            tp, owner = match_owner_script(script=script)
+        except:
+            return None
+        return self.owners.get((address_kinds[tp], bytes(owner)))
+
+    def match_transaction(self, transaction: RawTransaction) -> Optional[str]:
+        # the first watched address that receives an output of the transaction
+        for tx_out in transaction.txos_out:
+            address = self.match(tx_out.script)
+            if address is not None:
+                return address
+        return None
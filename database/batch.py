@@ -0,0 +1,56 @@
+import numpy as np
+
+from typing import Dict, Iterator, List, Union
+
+
+class VarBytes(object):  # a column of bytes of variable sizes, stored in one buffer
+
+    def __init__(self, data: bytes, offsets: np.ndarray):
+
+        self.data = data
+        self.offsets = offsets  # the item i is data[offsets[i]:offsets[i+1]]
+
+    @classmethod
+    def from_list(cls, items: List[bytes]):
+        offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in items], out=offsets[1:])
+        return cls(data=b"".join(items), offsets=offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.data[self.offsets[i]: self.offsets[i + 1]]
+
+
+def fixed_bytes(items: List[bytes], width: int) -> np.ndarray:
+    # a column of bytes of the same size, stored as a 2d uint8 array
+    return np.frombuffer(b"".join(items), dtype=np.uint8).reshape(-1, width)
+
+
+class ColumnBatch(object):  # rows stored as columns of contiguous arrays, cheap to send between processes
+
+    def __init__(self, columns: Dict[str, Union[np.ndarray, VarBytes]]):
+
+        self.columns = columns
+
+    def __len__(self):
+        if len(self.columns) == 0:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    def value(self, column: str, i: int):
+        col = self.columns[column]
+        if isinstance(col, VarBytes):
+            return col[i]
+        elif col.ndim == 2:  # fixed size bytes
+            return col[i].tobytes()
+        else:
+            return col[i].item()
+
+    def rows(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield {column: self.value(column, i) for column in self.columns}
+
+    def to_objs(self, cls) -> list:
+        return [cls(**row) for row in self.rows()]
@@ -0,0 +1,135 @@
+import struct
+import itertools
+
+import numpy as np
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from database.batch import ColumnBatch, VarBytes
+
+
+# streams of rows in the formats of COPY ... FROM STDIN, the rows are encoded chunk by chunk, so the whole data is
+# never held in memory as SQL text
+
+binary_header = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+binary_trailer = struct.pack(">h", -1)
+
+# the types supported by the binary format (struct and numpy formats), the values have to be sent with the exact
+# type of the column
+binary_types = {"int2": ">h", "int4": ">i", "int8": ">q", "bytea": None, "text": None}
+
+
+class CopyStream(object):  # file-like object read by copy_expert, the data is produced on demand
+
+    def __init__(self, chunks: Iterator[bytes]):
+
+        self.chunks = chunks
+        self.buffer = bytearray()
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += next(self.chunks)
+            except StopIteration:
+                break
+        size = len(self.buffer) if size < 0 else size
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+
+def encode_binary_value(value, tp: str) -> bytes:
+    if value is None:
+        return struct.pack(">i", -1)
+    if tp == "text":
+        value = value.encode("utf-8")
+    elif tp != "bytea":
+        value = struct.pack(binary_types[tp], value)
+    return struct.pack(">i", len(value)) + bytes(value)
+
+
+def binary_rows(rows: Iterable[dict], columns: List[str], types: Dict[str, str],
+                chunk_size: int) -> Iterator[bytes]:
+    count = struct.pack(">h", len(columns))
+    chunk = [binary_header]
+    for row in rows:
+        chunk.append(count + b"".join([encode_binary_value(row[column], types[column]) for column in columns]))
+        if len(chunk) >= chunk_size:
+            yield b"".join(chunk)
+            chunk = []
+    chunk.append(binary_trailer)
+    yield b"".join(chunk)
+
+
+def binary_batch(batch: ColumnBatch, columns: List[str], types: Dict[str, str],
+                 chunk_size: int) -> Iterator[bytes]:
+    # the fixed-size columns (integers, 2d arrays of bytes) are encoded with one structured array per chunk: each
+    # row is the number of fields, then the size and the value of each field
+    if any(isinstance(batch.columns[column], VarBytes) or types[column] == "text" for column in columns):
+        yield from binary_rows(batch.rows(), columns=columns, types=types, chunk_size=chunk_size)
+        return
+    fields, sizes = [("count", ">i2")], dict()
+    for column in columns:
+        values = batch.columns[column]
+        if types[column] == "bytea":
+            fields += [(f"{column}_size", ">i4"), (column, "u1", (values.shape[1],))]
+            sizes[column] = values.shape[1]
+        else:
+            fields += [(f"{column}_size", ">i4"), (column, binary_types[types[column]])]
+            sizes[column] = np.dtype(binary_types[types[column]]).itemsize
+    dtype = np.dtype(fields)
+    yield binary_header
+    for start in range(0, len(batch), chunk_size):
+        end = min(start + chunk_size, len(batch))
+        records = np.empty(end - start, dtype=dtype)
+        records["count"] = len(columns)
+        for column in columns:
+            records[f"{column}_size"] = sizes[column]
+            records[column] = batch.columns[column][start: end]
+        yield records.tobytes()
+    yield binary_trailer
+
+
+def escape_text(value) -> str:
+    if value is None:
+        return "\\N"
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\\\x" + bytes(value).hex()
+    value = str(value)
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def text_rows(rows: Iterable[dict], columns: List[str], chunk_size: int) -> Iterator[bytes]:
+    chunk = []
+    for row in rows:
+        chunk.append("\t".join([escape_text(row[column]) for column in columns]) + "\n")
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+    yield "".join(chunk).encode("utf-8")
+
+
+def copy_stream(rows: Union[ColumnBatch, Iterable], columns: Optional[List[str]] = None,
+                types: Optional[Dict[str, str]] = None, chunk_size: int = 100000) -> Tuple[CopyStream, List[str], str]:
+    # the stream of the rows, their columns, and the format of COPY (binary if the types of all the columns are
+    # known, text otherwise)
+    if isinstance(rows, ColumnBatch):
+        columns = list(rows.columns) if columns is None else columns
+        iter_rows = rows.rows()
+    else:  # Row objects or dicts, the first row gives the columns
+        iter_rows = (row if isinstance(row, dict) else row.to_dict() for row in rows)
+        first = next(iter_rows, None)
+        if first is None:  # no rows
+            return CopyStream(iter([])), [] if columns is None else columns, "text"
+        columns = list(first.keys()) if columns is None else columns
+        iter_rows = itertools.chain([first], iter_rows)
+    if types is not None and all(types.get(column) in binary_types for column in columns):
+        if isinstance(rows, ColumnBatch):
+            chunks = binary_batch(rows, columns=columns, types=types, chunk_size=chunk_size)
+        else:
+            chunks = binary_rows(iter_rows, columns=columns, types=types, chunk_size=chunk_size)
+        return CopyStream(chunks), columns, "binary"
+    return CopyStream(text_rows(iter_rows, columns=columns, chunk_size=chunk_size)), columns, "text"
@@ -1,21 +1,37 @@
 
+import os
 import json
+import time
 import datetime
+import itertools
+import weakref
+import threading
 import psycopg2
 
+import numpy as np
+
+from contextlib import contextmanager
+
 from psycopg2.extras import RealDictCursor
 from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from database.bulk import copy_stream
 
-from typing import Optional
+
+def quote(v: str) -> str:
+    return "'" + v.replace("'", "''") + "'"
 
 
 def preprocessing(v):
     if isinstance(v, str):
-        return "'" + v + "'"
+        return quote(v)
     elif isinstance(v, datetime.datetime):
-        return "'" + v.isoformat(sep=" ") + "'"
+        return quote(v.isoformat(sep=" "))
     elif isinstance(v, dict):
-        return "'" + json.dumps(v) + "'"
+        return quote(json.dumps(v))
     elif isinstance(v, bytes):
         return str(psycopg2.Binary(v))
     elif v is None:
@@ -24,13 +40,35 @@ def preprocessing(v):
         return str(v)
 
 
-def conditions_to_str(conditions: list):
+def to_param(v):
+    # value bound to a parameter of a query (psycopg2 adapts the python types, not the numpy ones)
+    if isinstance(v, np.generic):
+        return v.item()
+    elif isinstance(v, dict):
+        return json.dumps(v)
+    elif isinstance(v, (list, tuple, np.ndarray)):
+        return [to_param(x) for x in v]
+    return v
+
+
+def conditions_to_sql(conditions: list) -> Tuple[str, list]:
+    # the WHERE clause with placeholders, and the values of the parameters
     if conditions is None or len(conditions) == 0:
-        return ""
-    elif len(conditions) == 1:
-        return " WHERE " + str(conditions[0])
-    else:
-        return " WHERE " + " AND ".join(list(map(str, conditions)))
+        return "", []
+    clauses, params = zip(*[condition.sql() for condition in conditions])
+    return " WHERE " + " AND ".join(clauses), [param for param_ in params for param in param_]
+
+
+def iter_batches(cursor, batch_size: int = 100000) -> Iterator[List[tuple]]:
+    # the rows of an executed query by batches, the cursor is closed once they have been read
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if len(rows) == 0:
+                break
+            yield rows
+    finally:
+        cursor.close()
 
 
 class Condition:
@@ -40,14 +78,12 @@ class Condition:
         self.ct = ct
         self.value = value
 
-    def __str__(self):
+    def sql(self) -> Tuple[str, list]:
+        # the condition with a placeholder, the values of IN are bound as a single array
         if self.ct in ["=", "<=", ">=", "<", ">", "!=", "NOT"]:
-            return f"{self.col} {self.ct} {preprocessing(self.value)}"
+            return f"{self.col} {self.ct} %s", [to_param(self.value)]
         elif self.ct == "IN":
-            if len(self.value) > 1:
-                return f"{self.col} IN ({','.join([preprocessing(v) for v in self.value])})"
-            else:
-                return f"{self.col} = {preprocessing(self.value[0])}"
+            return f"{self.col} = ANY(%s)", [to_param(self.value)]
         else:
             raise ValueError
 
@@ -68,6 +104,76 @@ class DataServiceError(Exception):
         return self.msg
 
 
+class SharedPool(object):  # connections kept open between the queries, shared by the threads of a process
+
+    def __init__(self, conn_str: str, max_connection: int = 20, idle_check: float = 60.):
+
+        self.conn_str = conn_str
+        self.idle_check = idle_check  # a connection idle for longer is tested before being reused
+        self.idle = []  # (connection, time it was returned to the pool)
+        self.lock = threading.Lock()
+        self.semaphore = threading.BoundedSemaphore(max_connection)  # the threads wait for a free connection
+
+    @staticmethod
+    def is_healthy(connector, idle_since: float, idle_check: float) -> bool:
+        if connector.closed:
+            return False
+        if time.monotonic() - idle_since < idle_check:
+            return True
+        try:
+            cursor = connector.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            connector.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        self.semaphore.acquire()
+        try:
+            while True:
+                with self.lock:
+                    if len(self.idle) == 0:
+                        break
+                    connector, idle_since = self.idle.pop()
+                if self.is_healthy(connector, idle_since=idle_since, idle_check=self.idle_check):
+                    return connector
+                connector.close()
+            return psycopg2.connect(self.conn_str)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    def putconn(self, connector):
+        try:
+            if not connector.closed and connector.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connector.rollback()  # what has not been committed is discarded
+            if not connector.closed:
+                with self.lock:
+                    self.idle.append((connector, time.monotonic()))
+        except psycopg2.Error:
+            connector.close()
+        finally:
+            self.semaphore.release()
+
+    def closeall(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connector, _ in idle:
+            connector.close()
+
+
+# the pools of the process, by parameters of connection (and pid, the connections are not shared with the forks)
+shared_pools: Dict[tuple, SharedPool] = dict()
+shared_pools_lock = threading.Lock()
+
+cursor_ids = itertools.count()  # the names of the server-side cursors
+
+# the statements prepared on each connection (query -> name of the statement), they last as long as the connection
+prepared_statements = weakref.WeakKeyDictionary()
+
+
 class DataService:
 
     def __init__(self, endpoint: str, user: str, password: str, port: int = 5432, db: str = "postgres"):
@@ -83,36 +189,60 @@ class DataService:
         return cls(**d)
 
     @property
-    def connector(self):
-        conn_str = "host={0} dbname={1} user={2} password={3} port={4}".format(
+    def conn_str(self) -> str:
+        return "host={0} dbname={1} user={2} password={3} port={4}".format(
             self.endpoint, self.db, self.user, self.password, self.port)
-        return psycopg2.connect(conn_str)
+
+    @property
+    def connector(self):  # a new connection, to be closed by the caller
+        return psycopg2.connect(self.conn_str)
 
     def pool(self, min_connection: int, max_connection: int):
         return ThreadedConnectionPool(minconn=min_connection, maxconn=max_connection,
                                       user=self.user, password=self.password, host=self.endpoint,
                                       database=self.db, port=self.port)
 
-    def execute_query(self, query: str, fetch: str = None):
-        connector = self.connector
-        cursor = connector.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(query)
-        if fetch is None:
-            resp = None
-        elif fetch == "all":
-            resp = cursor.fetchall()
-        elif fetch == "one":
-            resp = cursor.fetchone()
-        else:
-            raise ValueError
-        connector.commit()
-        connector.close()
-        return resp
+    def shared_pool(self) -> SharedPool:
+        key = (self.endpoint, self.port, self.db, self.user, self.password, os.getpid())
+        with shared_pools_lock:
+            if key not in shared_pools:
+                shared_pools[key] = SharedPool(conn_str=self.conn_str)
+            return shared_pools[key]
+
+    @contextmanager
+    def connection(self):
+        # a connection of the shared pool, returned to the pool (after a rollback of what is not committed) on exit
+        pool = self.shared_pool()
+        connector = pool.getconn()
+        try:
+            yield connector
+        finally:
+            pool.putconn(connector)
+
+    def run(self, function: Callable, connector=None, retries: int = 1):
+        # function(connector) with the given connection, or with a connection of the shared pool, in which case the
+        # function is run again on a new connection if the connection was lost
+        if connector is not None:
+            return function(connector)
+        for attempt in range(retries + 1):
+            with self.connection() as connector:
+                try:
+                    return function(connector)
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    if not connector.closed or attempt == retries:
+                        raise
+
+    def execute_query(self, query: str, fetch: str = None, params: Optional[list] = None):
+        def function(connector):
+            resp = self.execute_query_w_connector(connector=connector, query=query, fetch=fetch, params=params)
+            connector.commit()
+            return resp
+        return self.run(function)
 
     @classmethod
-    def execute_query_w_connector(cls, connector, query: str, fetch: str = None):
+    def execute_query_w_connector(cls, connector, query: str, fetch: str = None, params: Optional[list] = None):
         cursor = connector.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(query)
+        cursor.execute(query, params or None)  # without parameters, the % of the query are not placeholders
         if fetch is None:
             resp = None
         elif fetch == "all":
@@ -124,14 +254,40 @@ class DataService:
         cursor.close()
         return resp
 
+    def execute_prepared(self, query: str, params: list, fetch: str = None):
+        def function(connector):
+            resp = self.execute_prepared_w_connector(connector=connector, query=query, params=params, fetch=fetch)
+            connector.commit()
+            return resp
+        return self.run(function)
+
+    @classmethod
+    def execute_prepared_w_connector(cls, connector, query: str, params: list, fetch: str = None):
+        # the query (with the placeholders $1, $2, ...) is prepared once per connection, then only executed, so the
+        # repeated queries (e.g. per block) are parsed and planned once
+        statements = prepared_statements.setdefault(connector, dict())
+        if query not in statements:
+            name = f"prepared_{len(statements)}"
+            cursor = connector.cursor()
+            cursor.execute(f"PREPARE {name} AS {query}")
+            cursor.close()
+            statements[query] = name
+        execute = f"EXECUTE {statements[query]}"
+        if len(params) > 0:
+            execute += " (" + ",".join(["%s"] * len(params)) + ")"
+        return cls.execute_query_w_connector(connector=connector, query=execute, fetch=fetch,
+                                             params=[to_param(param) for param in params])
+
     def len(self, table: str):
         r = f"SELECT count (*) from {table}"
-        connector = self.connector
-        cursor = connector.cursor()
-        cursor.execute(r)
-        resp = cursor.fetchone()
-        connector.close()
-        return resp[0]
+
+        def function(connector):
+            cursor = connector.cursor()
+            cursor.execute(r)
+            resp = cursor.fetchone()
+            cursor.close()
+            return resp
+        return self.run(function)[0]
 
     def insert(self, table: str, objs: list,
                on_conflict_do_nothing: bool = False,
@@ -140,8 +296,6 @@ class DataService:
                connector=None):
         if len(objs) == 0:
             return None
-        connector = self.connector if connector is None else connector
-        cursor = connector.cursor(cursor_factory=RealDictCursor)
         objs_ = [obj.to_dict() for obj in objs]
         columns = objs_[0].keys()
         r_v = ["(" + ",".join(list(map(preprocessing, obj.values()))) + ")" for obj in objs_]
@@ -153,51 +307,139 @@ class DataService:
             r += on_conflict_do
         if returning is not None:
             r += returning
-        try:
+
+        def function(connector_):
+            cursor = connector_.cursor(cursor_factory=RealDictCursor)
             cursor.execute(r)
-            connector.commit()
-            if returning is not None:
-                resp = cursor.fetchall()
-            else:
-                resp = None
-            connector.close()
+            connector_.commit()
+            return cursor.fetchall() if returning is not None else None
+        try:
+            return self.run(function, connector=connector)
         except Exception as e:
-            connector.rollback()
-            connector.close()
+            if connector is not None and not connector.closed:
+                connector.rollback()
             raise DataServiceError(action="insert", query="", error_name=e.__class__.__name__)
-        return resp
 
-    def delete(self, table: str, conditions: list):
-        connector = self.connector
-        cursor = connector.cursor()
-        r = f"DELETE FROM {table}"
-        r += conditions_to_str(conditions)
-        try:
+    def bulk_load(self, table: str, rows, columns: list = None, types: dict = None, connector=None,
+                  chunk_size: int = 100000) -> int:
+        # COPY of the rows (a ColumnBatch, Row objects or dicts) into the table, the rows are streamed to the server
+        # chunk by chunk, in the binary format if the types of the columns are given (see Row.copy_types)
+        stream, columns, fmt = copy_stream(rows, columns=columns, types=types, chunk_size=chunk_size)
+        if len(columns) == 0:
+            return 0
+        r = f"COPY {table} ({','.join(columns)}) FROM STDIN WITH (FORMAT {fmt})"
+
+        def function(connector_):
+            cursor = connector_.cursor()
+            cursor.copy_expert(r, stream)
+            connector_.commit()
+            resp = cursor.rowcount
+            cursor.close()
+            return resp
+        try:  # not retried, the stream can only be read once
+            return self.run(function, connector=connector, retries=0)
+        except Exception as e:
+            if connector is not None and not connector.closed:
+                connector.rollback()
+            raise DataServiceError(action="bulk_load", query=r, error_name=e.__class__.__name__)
+
+    def upsert(self, table: str, rows, columns: list = None, types: dict = None,
+               on_conflict_do_nothing: bool = False,
+               on_conflict_do: str = None,
+               returning: str = None,
+               connector=None,
+               chunk_size: int = 100000,
+               batch_size: int = 100000):
+        # same as insert, but the rows are copied (see bulk_load) into a temporary staging table, then merged into the
+        # table with a single INSERT ... SELECT, the clauses on_conflict_do and returning are the ones of insert
+        # the returned rows are yielded as batches of tuples (see iter_batches): a server-side cursor cannot be
+        # declared on an INSERT, but the result is kept by libpq in its compact form and the python rows are only
+        # built one batch at a time
+        stream, columns, fmt = copy_stream(rows, columns=columns, types=types, chunk_size=chunk_size)
+        if len(columns) == 0:
+            return None
+        staging = f"{table}_staging"
+        columns = ",".join(columns)
+        r = f"INSERT INTO {table} AS t ({columns}) SELECT {columns} FROM {staging}"
+        if on_conflict_do_nothing:
+            r += " ON CONFLICT DO NOTHING"
+        elif on_conflict_do is not None:
+            r += on_conflict_do
+        if returning is not None:
+            r += returning
+
+        def function(connector_):
+            cursor = connector_.cursor()
+            # the staging table only has the copied columns, without the constraints of the table
+            cursor.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {columns} FROM {table} LIMIT 0")
+            cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT {fmt})", stream)
             cursor.execute(r)
+            connector_.commit()
+            if returning is None:
+                cursor.close()
+            return cursor
+        try:  # not retried, the stream can only be read once
+            cursor = self.run(function, connector=connector, retries=0)
+        except Exception as e:
+            if connector is not None and not connector.closed:
+                connector.rollback()
+            raise DataServiceError(action="upsert", query=r, error_name=e.__class__.__name__)
+        return iter_batches(cursor, batch_size=batch_size) if returning is not None else None
+
+    def delete(self, table: str, conditions: list):
+        where, params = conditions_to_sql(conditions)
+        r = f"DELETE FROM {table}" + where
+
+        def function(connector):
+            cursor = connector.cursor()
+            cursor.execute(r, params or None)
             connector.commit()
-            connector.close()
+            cursor.close()
+        try:
+            self.run(function)
         except Exception as e:
-            connector.rollback()
-            connector.close()
             raise DataServiceError(action="delete", query=r, error_name=e.__class__.__name__)
 
-    def fetch(self, table: str, columns: list = None, conditions: Optional[list] = None,
-              orderby: str = None, order: str = "asc", limit: int = None, distinct: bool = False):
-        connector = self.connector
-        cursor = connector.cursor(cursor_factory=RealDictCursor)
+    def iter_fetch(self, query: str, params: Optional[list] = None, batch_size: int = 100000,
+                   dtype: Optional[np.dtype] = None) -> Iterator[Union[List[tuple], np.ndarray]]:
+        # rows of the query by batches, read with a server-side cursor so that only one batch is held in memory, the
+        # batches are lists of tuples, or record arrays if the dtype of the records is given
+        with self.connection() as connector:
+            cursor = connector.cursor(name=f"iter_fetch_{next(cursor_ids)}")
+            cursor.itersize = batch_size
+            try:
+                cursor.execute(query, params or None)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if len(rows) == 0:
+                        break
+                    yield rows if dtype is None else np.array(rows, dtype=dtype)
+            except psycopg2.Error as e:
+                raise DataServiceError(action="iter_fetch", query=query, error_name=e.__class__.__name__)
+            finally:
+                cursor.close()
+
+    @classmethod
+    def fetch_query(cls, table: str, columns: list = None, conditions: Optional[list] = None,
+                    orderby: str = None, order: str = "asc", limit: int = None,
+                    distinct: bool = False) -> Tuple[str, list]:
+        # the query, and the values of its parameters
         columns = ",".join(columns) if columns is not None else "*"
         r = f"SELECT DISTINCT {columns} FROM {table}" if distinct else f"SELECT {columns} FROM {table}"
-        if conditions is not None:
-            r += conditions_to_str(conditions)
+        where, params = conditions_to_sql(conditions)
+        r += where
         if orderby is not None:
             r += f" ORDER BY {orderby} {order}"
         if limit is not None:
             r += f" LIMIT {limit}"
+        return r, params
+
+    def fetch(self, table: str, columns: list = None, conditions: Optional[list] = None,
+              orderby: str = None, order: str = "asc", limit: int = None, distinct: bool = False):
+        r, params = self.fetch_query(table=table, columns=columns, conditions=conditions, orderby=orderby,
+                                     order=order, limit=limit, distinct=distinct)
         try:
-            cursor.execute(r)
-            resp = cursor.fetchall()
-            connector.close()
-            return resp
+            return self.run(lambda connector: self.execute_query_w_connector(connector=connector, query=r,
+                                                                             fetch="all", params=params))
         except Exception as e:
-            connector.close()
             raise DataServiceError(action="fetch", query=r, error_name=e.__class__.__name__)
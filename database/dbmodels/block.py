@@ -1,9 +1,11 @@
 
+from typing import Union
 from dataclasses import dataclass
 from psycopg2 import Binary
 
 from database.dbmodels.row import Row
-from blockchain.models.raw_block import RawBlock
+
+from blockchain.models.raw_block import RawBlock, RawBlockHeader
 
 
 @dataclass
@@ -16,7 +18,7 @@ class Block(Row):
     num_transactions: int
 
     @classmethod
-    def from_raw_block(cls, raw_block: RawBlock):
+    def from_raw_block(cls, raw_block: Union[RawBlock, RawBlockHeader]):
         return cls(hash=Binary(raw_block.hash),
                    num_file=raw_block.num_file,
                    byte_start=raw_block.byte_start,
@@ -1,27 +1,35 @@
-
+from typing import Dict
 from dataclasses import dataclass
 
 from database.dbmodels.row import Row
 
+from blockchain.special_transactions.colored_coin import registered_protocols
+
 
 @dataclass
 class ColoredCoin(Row):
 
     block: int  # block
     position: int  # position in the block
-    oa: int  # is open asset
-    epobc: int  # is epobc
-    ol_ab: int  # is omnilayer a or b
-    ol_c: int  # is omnilayer c
+    protocols: Dict[str, int]  # is each registered protocol (e.g. oa, epobc, ol_ab, ol_c), one column each
+
+    def to_dict(self):
+        return {"block": self.block, "position": self.position, **self.protocols}
 
     @classmethod
     def table_name(cls):
         return "colored_coin"
 
     @classmethod
-    def create_table(cls):
-        return (f"CREATE TABLE {cls.table_name()} (block INTEGER, position INTEGER, oa INTEGER, epobc INTEGER, "
-                f"ol_ab INTEGER, ol_c INTEGER, PRIMARY KEY (block, position))")
+    def new_table_name(cls):
+        # the table is rebuilt into this one, which replaces it once fully populated (see swap_table)
+        return f"{cls.table_name()}_new"
+
+    @classmethod
+    def create_table(cls, table_name: str = None):
+        columns = "".join(f"{column} INTEGER, " for column in registered_protocols())
+        return (f"CREATE TABLE {table_name or cls.table_name()} (block INTEGER, position INTEGER, {columns}"
+                f"PRIMARY KEY (block, position))")
 
     @classmethod
     def create_index_block(cls):
@@ -32,5 +40,13 @@ class ColoredCoin(Row):
         return f"DROP INDEX IF EXISTS {cls.table_name()}_block"
 
     @classmethod
-    def drop_table(cls):
-        return f"DROP TABLE IF EXISTS {cls.table_name()}"
+    def drop_table(cls, table_name: str = None):
+        return f"DROP TABLE IF EXISTS {table_name or cls.table_name()}"
+
+    @classmethod
+    def swap_table(cls):
+        # the statements are run by a single execute, i.e. in one transaction: the table is either the previous one or
+        # the new one
+        return (f"DROP TABLE IF EXISTS {cls.table_name()}; "
+                f"ALTER TABLE {cls.new_table_name()} RENAME TO {cls.table_name()}; "
+                f"ALTER INDEX {cls.new_table_name()}_pkey RENAME TO {cls.table_name()}_pkey")
@@ -20,6 +20,11 @@ class TransactionEdge(Row):
     def table_name(cls):
         return "transaction_edges"
 
+    @classmethod
+    def copy_types(cls):
+        return {"a": "int4", "b": "int4", "reveal": "int4", "last_seen": "int4", "total": "int4",
+                "min_sent": "int8", "max_sent": "int8", "total_sent": "int8"}
+
     @classmethod
     def create_table(cls):
         return (f"CREATE TABLE {cls.table_name()} (a INTEGER NOT NULL, b INTEGER NOT NULL, "
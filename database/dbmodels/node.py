@@ -16,6 +16,10 @@ class Node(Row):
     def table_name(cls):
         return "nodes"
 
+    @classmethod
+    def copy_types(cls):
+        return {"hash": "bytea", "reveal": "int4", "reuse": "int4"}
+
     @classmethod
     def create_table(cls):
         return (f"CREATE TABLE {cls.table_name()} (node_id INTEGER GENERATED BY DEFAULT AS IDENTITY, "
@@ -9,6 +9,11 @@ class Row:
     def table_name(cls):
         raise NotImplementedError
 
+    @classmethod
+    def copy_types(cls):
+        # postgres types of the columns, required by the binary COPY of DataService.bulk_load (None: text COPY)
+        return None
+
     @classmethod
     def drop_table(cls):
         return f"DROP TABLE IF EXISTS {cls.table_name()}"
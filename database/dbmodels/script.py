@@ -17,6 +17,10 @@ class Script(Row):
     def table_name(cls):
         return "scripts"
 
+    @classmethod
+    def copy_types(cls):
+        return {"reveal": "int4", "hash160": "bytea", "hash256": "bytea", "script": "bytea"}
+
     @classmethod
     def create_table(cls):
         return (f"CREATE TABLE {cls.table_name()} (reveal INTEGER NOT NULL, hash160 BYTEA PRIMARY KEY, "
@@ -17,6 +17,10 @@ class Spent_TXO(Row):
     def table_name(cls):
         return "spent_txos"
 
+    @classmethod
+    def copy_types(cls):
+        return {"block_num": "int4", "position": "int2", "txo_id": "bytea"}
+
     @classmethod
     def create_table(cls):
         return (f"CREATE TABLE {cls.table_name()} (block_num INTEGER NOT NULL, "
@@ -57,6 +61,11 @@ class Created_TXO(Row):
     def table_name(cls):
         return "created_txos"
 
+    @classmethod
+    def copy_types(cls):
+        return {"block_num": "int4", "position": "int2", "txo_id": "bytea", "tp": "int2", "value": "bytea",
+                "node_id": "int4"}
+
     @classmethod
     def create_table(cls):
         return (f"CREATE TABLE {cls.table_name()} (block_num INTEGER NOT NULL, position SMALLINT NOT NULL, "
@@ -1,12 +1,17 @@
 
-from typing import Optional
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 
+from blockchain.read_binary_files import read_blocks
+from blockchain.models.raw_block import RawBlock
+from blockchain.models.columnar_block import ColumnarBlock
+
+from database.dbmodels.block import Block
 from database.dbmodels.txo import Created_TXO, Spent_TXO
 from database.dbmodels.node import Node
 from database.dbmodels.coinjoin import CoinJoin
 from database.dbmodels.colored_coin import ColoredCoin
 
-from database.dataService import DataService
+from database.dataService import DataService, Condition
 
 
 def prepare_table(ds: DataService, cls):
@@ -26,9 +31,36 @@ def prepare_table(ds: DataService, cls):
     return max_block
 
 
-def query_input_txos(block_num: int, join_node: bool = False, join_alias: bool = False,
+def fetch_block_locations(ds: DataService, conditions: list) -> List[Tuple[int, int, int]]:
+    # locations (block_num, num_file, byte_start) of the selected blocks, to be read with read_blocks
+    query, params = ds.fetch_query(table=Block.table_name(), columns=["num", "num_file", "byte_start"],
+                                   conditions=conditions)
+    locations = []
+    for rows in ds.iter_fetch(query=query, params=params):
+        locations += rows
+    return locations
+
+
+def read_blocks_at_heights(ds: DataService, folder: str, heights: Iterable[int], drop_zero: bool = True,
+                           zero_copy: bool = False, columnar: bool = False,
+                           n_threads: int = 1) -> Iterator[Union[RawBlock, ColumnarBlock]]:
+    # the blocks at the given heights, located with the table of the blocks (which must be populated up to them),
+    # the blocks are yielded in the order of the files, then of the offsets (see read_blocks)
+    heights = sorted(set(heights))
+    locations = fetch_block_locations(ds=ds, conditions=[Condition("num", "IN", heights)])
+    missing = set(heights) - {block_num for block_num, _, _ in locations}
+    if len(missing) > 0:
+        raise ValueError(f"No location for the blocks {sorted(missing)[:10]}, the table {Block.table_name()} must "
+                         f"be populated up to the block {max(missing)}")
+    yield from read_blocks(folder, locations, drop_zero=drop_zero, zero_copy=zero_copy, columnar=columnar,
+                           n_threads=n_threads)
+
+
+def query_input_txos(block_num: Union[int, str], join_node: bool = False, join_alias: bool = False,
                      exclude_coinjoin: bool = False, exclude_colored_coin: bool = False,
-                     only_one_per_position: bool = False, only_positions: Optional[list] = None):
+                     only_one_per_position: bool = False, only_positions: Optional[str] = None):
+    # block_num is either a block number or a placeholder (e.g. "$1", see DataService.execute_prepared)
+    # only_positions is the placeholder of an array of positions (e.g. "$2"), bound with the other parameters
 
     if only_one_per_position:
         query = (f"SELECT DISTINCT ON (position) position,txo_id "
@@ -47,7 +79,7 @@ def query_input_txos(block_num: int, join_node: bool = False, join_alias: bool =
 
     if only_positions is not None:
         assert not exclude_coinjoin and not exclude_colored_coin
-        query += f" AND position IN ({','.join([str(position) for position in only_positions])})"
+        query += f" AND position = ANY({only_positions})"
 
     query = (f"SELECT spent.*,created.node_id,created.value,created.block_num,created.tp FROM ({query}) AS spent "
              f"INNER JOIN {Created_TXO.table_name()} AS created ON spent.txo_id = created.txo_id")
@@ -69,9 +101,10 @@ def query_input_txos(block_num: int, join_node: bool = False, join_alias: bool =
     return query
 
 
-def query_output_txos(block_num: int, join_node: bool = False, join_alias: bool = False,
+def query_output_txos(block_num: Union[int, str], join_node: bool = False, join_alias: bool = False,
                       exclude_coinjoin: bool = False, exclude_colored_coin: bool = False,
-                      only_positions: Optional[list] = None):
+                      only_positions: Optional[str] = None):
+    # same parameters as query_input_txos
 
     query = (f"SELECT DISTINCT ON (position,txo_id) position,txo_id,node_id,value,tp "
              f"FROM {Created_TXO.table_name()} WHERE block_num = {block_num}")
@@ -86,7 +119,7 @@ def query_output_txos(block_num: int, join_node: bool = False, join_alias: bool
 
     if only_positions is not None:
         assert not exclude_coinjoin and not exclude_colored_coin
-        query += f" AND position IN ({','.join([str(position) for position in only_positions])})"
+        query += f" AND position = ANY({only_positions})"
 
     if join_node:
         query = (f"SELECT created.*,nodes.hash AS node_hash,nodes.reveal,nodes.reuse FROM ({query}) AS created "
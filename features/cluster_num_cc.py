@@ -1,7 +1,7 @@
 
 # num cc = total num nodes - num nodes clusterisés + num clusters
 
-import pandas as pd
+import numpy as np
 from tqdm import tqdm
 
 from database.dataService import DataService, Condition
@@ -25,13 +25,13 @@ def add_cluster_connected_components_features(db: dict, max_num_edges: int = 200
 
     # do for the other clusters
     query = f"SELECT alias, COUNT(*) FROM {ClusterTransactionEdge.table_name()} GROUP BY alias ORDER BY count"
-    rows = ds.execute_query(query=query, fetch="all")
-    rows = [{"alias": row["alias"], "count": row["count"]} for row in rows if row["count"] > 1]
-    arr = pd.DataFrame(rows)[::-1]
+    # the counts are streamed as record arrays, only the selected clusters are kept
+    dtype = np.dtype([("alias", np.int64), ("count", np.int64)])
+    counts = [batch[np.isin(batch["count"], [2, 3])] for batch in ds.iter_fetch(query=query, dtype=dtype)]
+    counts = np.concatenate(counts)[::-1] if len(counts) > 0 else np.empty(0, dtype=dtype)
 
-    arr = arr.loc[arr["count"].isin([2, 3])]
-    total_edges = int(arr["count"].sum())
-    arr = arr.values
+    total_edges = int(counts["count"].sum())
+    arr = zip(counts["alias"].tolist(), counts["count"].tolist())
 
     loop_alias = []
     loop_total_edges = 0
@@ -100,7 +100,7 @@ def add_cluster_connected_components_features(db: dict, max_num_edges: int = 200
                 on_conflict_do = (" ON CONFLICT (alias) DO UPDATE SET "
                                   "cluster_num_cc = EXCLUDED.cluster_num_cc, "
                                   "cluster_num_nodes_in_cc = EXCLUDED.cluster_num_nodes_in_cc")
-                ds.insert(table=NodeFeatures.table_name(), objs=new_features, on_conflict_do=on_conflict_do)
+                ds.upsert(table=NodeFeatures.table_name(), rows=new_features, on_conflict_do=on_conflict_do)
 
                 del uf
                 del num_nodes
@@ -166,7 +166,7 @@ def add_cluster_connected_components_features(db: dict, max_num_edges: int = 200
             on_conflict_do = (" ON CONFLICT (alias) DO UPDATE SET "
                               "cluster_num_cc = EXCLUDED.cluster_num_cc, "
                               "cluster_num_nodes_in_cc = EXCLUDED.cluster_num_nodes_in_cc")
-            ds.insert(table=NodeFeatures.table_name(), objs=new_features, on_conflict_do=on_conflict_do)
+            ds.upsert(table=NodeFeatures.table_name(), rows=new_features, on_conflict_do=on_conflict_do)
 
             del uf
             del num_nodes
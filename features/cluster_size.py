@@ -30,9 +30,10 @@ def add_cluster_size(db: dict, start: int, end: int, block_step: int):
     def get_aliases_block(worker_state, block_num) -> list:
         connector = worker_state["pool"].getconn()
         query = (f"SELECT n.node_id, a.alias "
-                 f"FROM (SELECT * FROM {Node.table_name()} WHERE reveal = {block_num}) AS n "
+                 f"FROM (SELECT * FROM {Node.table_name()} WHERE reveal = $1) AS n "
                  f"LEFT JOIN {Alias.table_name()} AS a ON n.node_id = a.node_id")
-        rows = DataService.execute_query_w_connector(connector=connector, query=query, fetch="all")
+        rows = DataService.execute_prepared_w_connector(connector=connector, query=query,
+                                                        params=[block_num], fetch="all")
         worker_state["pool"].putconn(connector)
         aliases = [row["node_id"] if row["alias"] is None else row["alias"] for row in rows]
         return aliases
@@ -57,7 +58,7 @@ def add_cluster_size(db: dict, start: int, end: int, block_step: int):
     for ind, alias in enumerate(dict_cluster_sizes.keys()):
         new_objs.append(NodeFeatures(alias=alias, cluster_size=dict_cluster_sizes[alias]))
         if ind % 500000 == 0:
-            ds.insert(table=NodeFeatures.table_name(), objs=new_objs, on_conflict_do=on_conflict_do)
+            ds.upsert(table=NodeFeatures.table_name(), rows=new_objs, on_conflict_do=on_conflict_do)
             new_objs = []
 
-    ds.insert(table=NodeFeatures.table_name(), objs=new_objs, on_conflict_do=on_conflict_do)
+    ds.upsert(table=NodeFeatures.table_name(), rows=new_objs, on_conflict_do=on_conflict_do)
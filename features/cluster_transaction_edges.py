@@ -47,15 +47,17 @@ def add_cluster_transaction_edges(db: dict, start: int, end: int, num_steps: int
 
     def get_cluster_edges_block(worker_state, block_num):
         connector = worker_state["pool"].getconn()
-        query_inputs = query_input_txos(block_num=block_num, join_node=False, join_alias=True, exclude_coinjoin=True,
+        query_inputs = query_input_txos(block_num="$1", join_node=False, join_alias=True, exclude_coinjoin=True,
                                         exclude_colored_coin=True, only_one_per_position=False)
-        input_txos = DataService.execute_query_w_connector(connector=connector, query=query_inputs, fetch="all")
+        input_txos = DataService.execute_prepared_w_connector(connector=connector, query=query_inputs,
+                                                              params=[block_num], fetch="all")
         input_txos = [{"position": row["position"], "txo_id": bytes(row["txo_id"]),
                        "node_id": row["node_id"], "value": bytes(row["value"]), "alias": row["alias"],
                        "reuse": row.get("reuse", -1), "reveal": row.get("reveal", -1)} for row in input_txos]
-        query_outputs = query_output_txos(block_num=block_num, join_node=False, join_alias=True,
+        query_outputs = query_output_txos(block_num="$1", join_node=False, join_alias=True,
                                           exclude_coinjoin=True, exclude_colored_coin=True)
-        output_txos = DataService.execute_query_w_connector(connector=connector, query=query_outputs, fetch="all")
+        output_txos = DataService.execute_prepared_w_connector(connector=connector, query=query_outputs,
+                                                               params=[block_num], fetch="all")
         output_txos = [{"position": row["position"], "txo_id": bytes(row["txo_id"]),
                         "node_id": row["node_id"], "value": bytes(row["value"]), "alias": row["alias"],
                         "reuse": row.get("reuse", -1), "reveal": row.get("reveal", -1)} for row in output_txos]
@@ -26,8 +26,9 @@ def add_degree_feature(db: dict, start: int, end: int, block_step: int):
 
     def get_edges_block(worker_state, block_num) -> list:
         connector = worker_state["pool"].getconn()
-        query = f"SELECT * from {UndirectedTransactionEdge.table_name()} where reveal = {block_num}"
-        edges = DataService.execute_query_w_connector(connector=connector, query=query, fetch="all")
+        query = f"SELECT * from {UndirectedTransactionEdge.table_name()} where reveal = $1"
+        edges = DataService.execute_prepared_w_connector(connector=connector, query=query,
+                                                         params=[block_num], fetch="all")
         edges = [(row["a"], row["b"]) for row in edges]
         worker_state["pool"].putconn(connector)
         return edges
@@ -59,8 +60,8 @@ def add_degree_feature(db: dict, start: int, end: int, block_step: int):
     for ind, alias in tqdm(enumerate(dict_degree.keys()), total=len(dict_degree)):
         new_objs.append(NodeFeatures(alias=alias, degree=dict_degree[alias]))
         if ind % 500000 == 0:
-            ds.insert(table=NodeFeatures.table_name(), objs=new_objs, on_conflict_do=on_conflict_do)
+            ds.upsert(table=NodeFeatures.table_name(), rows=new_objs, on_conflict_do=on_conflict_do)
             new_objs = []
 
-    ds.insert(table=NodeFeatures.table_name(), objs=new_objs, on_conflict_do=on_conflict_do)
+    ds.upsert(table=NodeFeatures.table_name(), rows=new_objs, on_conflict_do=on_conflict_do)
     ds.execute_query(query=UndirectedTransactionEdge.drop_index_reveal())
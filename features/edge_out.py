@@ -35,8 +35,9 @@ def add_out_transaction_features(db: dict, start: int, end: int, block_step: int
     # function to get all edges from a specific block
     def get_edges_block(worker_state, block_num) -> list:
         connector = worker_state["pool"].getconn()
-        query = f"SELECT * from {TransactionEdge.table_name()} where reveal = {block_num}"
-        edges = DataService.execute_query_w_connector(connector=connector, query=query, fetch="all")
+        query = f"SELECT * from {TransactionEdge.table_name()} where reveal = $1"
+        edges = DataService.execute_prepared_w_connector(connector=connector, query=query,
+                                                         params=[block_num], fetch="all")
         edges = [(row["a"], row["reveal"], row["last_seen"], row["total"],
                   row["min_sent"], row["max_sent"], row["total_sent"]) for row in edges]
         worker_state["pool"].putconn(connector)
@@ -89,7 +90,7 @@ def add_out_transaction_features(db: dict, start: int, end: int, block_step: int
                                      total_sent=dict_total_sent[alias]))
 
         if ind % 500000 == 0:
-            ds.insert(table=NodeFeatures.table_name(), objs=new_objs, on_conflict_do=on_conflict_do)
+            ds.upsert(table=NodeFeatures.table_name(), rows=new_objs, on_conflict_do=on_conflict_do)
             new_objs = []
 
-    ds.insert(table=NodeFeatures.table_name(), objs=new_objs, on_conflict_do=on_conflict_do)
+    ds.upsert(table=NodeFeatures.table_name(), rows=new_objs, on_conflict_do=on_conflict_do)
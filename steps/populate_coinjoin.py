@@ -51,14 +51,14 @@ def populate_coinjoins(db: dict, start: int, end: int, do: bool):
             try:
 
                 connector = worker_state["pool"].getconn()
-                query_inputs = query_input_txos(block_num=block_num, join_node=False)
-                input_txos = DataService.execute_query_w_connector(connector=connector,
-                                                                   query=query_inputs, fetch="all")
+                query_inputs = query_input_txos(block_num="$1", join_node=False)
+                input_txos = DataService.execute_prepared_w_connector(connector=connector, query=query_inputs,
+                                                                      params=[block_num], fetch="all")
                 input_txos = [{"position": row["position"], "txo_id": bytes(row["txo_id"]),
                                "node_id": row["node_id"], "value": bytes(row["value"])} for row in input_txos]
-                query_outputs = query_output_txos(block_num=block_num, join_node=False)
-                output_txos = DataService.execute_query_w_connector(connector=connector,
-                                                                    query=query_outputs, fetch="all")
+                query_outputs = query_output_txos(block_num="$1", join_node=False)
+                output_txos = DataService.execute_prepared_w_connector(connector=connector, query=query_outputs,
+                                                                       params=[block_num], fetch="all")
                 output_txos = [{"position": row["position"], "txo_id": bytes(row["txo_id"]),
                                 "node_id": row["node_id"], "value": bytes(row["value"])} for row in output_txos]
                 worker_state["pool"].putconn(connector)
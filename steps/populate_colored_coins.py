@@ -1,66 +1,68 @@
 
 from tqdm import tqdm
-from typing import List
-from copy import deepcopy
-from joblib import Parallel, delayed
+from typing import List, Tuple
 
 from database.dataService import DataService, Condition
-from blockchain.read_binary_files import process_file
+from blockchain.read_binary_files import read_file_blocks, file_name
+from blockchain.parallel import parallel_map
 
-from database.utils import prepare_table
+from database.utils import fetch_block_locations
 
-from database.dbmodels.block import Block
 from database.dbmodels.colored_coin import ColoredCoin
 
-from blockchain.special_transactions.colored_coin import (is_epobc_protocol, is_open_asset_protocol,
-                                                          is_omnilayer_class_c, is_omnilayer_class_a_b)
+from blockchain.special_transactions.colored_coin import detect_protocols, registered_protocols
 
 
-def extract_from_file(file: str, folder: str, hash2num: dict[bytes, int]) -> List[ColoredCoin]:
+def extract_from_file(file: str, folder: str, locations: List[Tuple[int, int]]) -> List[ColoredCoin]:
     colored_coin_transactions: List[ColoredCoin] = []
-    processed_file = process_file(file=file, folder=folder, drop_zero=False)
-    for raw_block in processed_file:
-        try:
-            block = hash2num[raw_block.hash]
-        except:
-            continue
+    protocols_columns = registered_protocols()  # each protocol has its column in the table
+    # the zero-value outputs are kept, the OP_RETURN outputs are usually of value 0
+    for raw_block in read_file_blocks(file=file, folder=folder, locations=locations, drop_zero=False,
+                                      zero_copy=True):
+        block = raw_block.block_num
         for position_transaction, raw_transaction in enumerate(raw_block.transactions):
             if position_transaction == 0:
                 continue
-            is_oap = is_open_asset_protocol(transaction=raw_transaction)
-            is_epobc = is_epobc_protocol(transaction=raw_transaction)
-            is_ol_a_b = is_omnilayer_class_a_b(transaction=raw_transaction)
-            is_ol_c = is_omnilayer_class_c(transaction=raw_transaction)
-            if is_oap or is_epobc or is_ol_a_b or is_ol_c:
+            protocols = detect_protocols(transaction=raw_transaction)
+            if len(protocols) > 0:
                 colored_coin_transactions.append(
-                    ColoredCoin(block=block, position=position_transaction, oa=int(is_oap),
-                                epobc=int(is_epobc), ol_ab=int(is_ol_a_b), ol_c=int(is_ol_c)))
+                    ColoredCoin(block=block, position=position_transaction,
+                                protocols={column: int(column in protocols) for column in protocols_columns}))
     return colored_coin_transactions
 
 
-def populate_colored_coins(db: dict, start: int, end: int, folder: str, do: bool):
+def populate_colored_coins(db: dict, start: int, end: int, folder: str, do: bool, n_jobs: int = 10):
 
     if not do:
         return None
 
-    rows = DataService(**db).fetch(table=Block.table_name(),
-                                   conditions=[Condition("num", "<=", end),
-                                               Condition("num", ">=", start)])
-
-    files = sorted(list(set([str(row["num_file"]) for row in rows])))
-    files = ["blk" + "0" * (5 - len(file)) + file + ".dat" for file in files]
-    hash2num = {bytes(row["hash"]): int(row["num"]) for row in rows}
-
-    transactions = Parallel(n_jobs=10)(delayed(extract_from_file)(file, folder, deepcopy(hash2num))
-                                       for file in tqdm(files))
-
-    transactions = [transaction for transactions_ in transactions for transaction in transactions_]
-    transactions = [transaction for transaction in transactions if start <= transaction.block <= end]
+    locations = fetch_block_locations(ds=DataService(**db), conditions=[Condition("num", "<=", end),
+                                                                        Condition("num", ">=", start)])
+    file2locations = dict()
+    for block_num, num_file, byte_start in locations:
+        file2locations.setdefault(num_file, []).append((block_num, byte_start))
+    tasks = [{"file": file_name(num_file), "locations": file2locations[num_file]}
+             for num_file in sorted(file2locations)]
 
     print(f"Populating the table {ColoredCoin.table_name()}, target block: {end}")
+    # the table is rebuilt into a new one, the current table is only replaced once all the files have been parsed
     ds = DataService(**db)
-    ds.execute_query(query=ColoredCoin.drop_table())
-    prepare_table(ds=ds, cls=ColoredCoin)
-
-    print(f"Inserting {len(transactions)} transactions")
-    DataService(**db).insert(table=ColoredCoin.table_name(), objs=transactions)
+    new_table = ColoredCoin.new_table_name()
+    ds.execute_query(query=ColoredCoin.drop_table(table_name=new_table))
+    ds.execute_query(query=ColoredCoin.create_table(table_name=new_table))
+
+    # the files are parsed in parallel, and the transactions of each file are inserted as soon as it is parsed
+    num_transactions = 0
+    try:
+        for transactions in tqdm(parallel_map(extract_from_file, tasks, n_jobs=n_jobs, folder=folder),
+                                 total=len(tasks)):
+            if len(transactions) > 0:
+                ds.insert(table=new_table, objs=transactions)
+            num_transactions += len(transactions)
+    except Exception as e:
+        print(f"Failure, the table {ColoredCoin.table_name()} is left unchanged")
+        ds.execute_query(query=ColoredCoin.drop_table(table_name=new_table))
+        raise e
+
+    ds.execute_query(query=ColoredCoin.swap_table())
+    print(f"{num_transactions} transactions inserted")
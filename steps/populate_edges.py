@@ -56,17 +56,19 @@ def populate_edges(db: dict, start: int, end: int, do: bool, block_step: int, ex
 
         connector = worker_state["pool"].getconn()
 
-        query_inputs = query_input_txos(block_num=block_num, join_node=False, join_alias=True,
+        query_inputs = query_input_txos(block_num="$1", join_node=False, join_alias=True,
                                         exclude_coinjoin=exclude_coinjoin, exclude_colored_coin=exclude_colored_coin,
                                         only_one_per_position=only_one_per_position)
-        input_txos = DataService.execute_query_w_connector(connector=connector, query=query_inputs, fetch="all")
+        input_txos = DataService.execute_prepared_w_connector(connector=connector, query=query_inputs,
+                                                              params=[block_num], fetch="all")
         input_txos = [{"position": row["position"], "txo_id": bytes(row["txo_id"]),
                        "node_id": row["node_id"], "value": bytes(row["value"]), "alias": row["alias"],
                        "reuse": row.get("reuse", -1), "reveal": row.get("reveal", -1)} for row in input_txos]
 
-        query_outputs = query_output_txos(block_num=block_num, join_node=False, join_alias=True,
+        query_outputs = query_output_txos(block_num="$1", join_node=False, join_alias=True,
                                           exclude_coinjoin=exclude_coinjoin, exclude_colored_coin=exclude_colored_coin)
-        output_txos = DataService.execute_query_w_connector(connector=connector, query=query_outputs, fetch="all")
+        output_txos = DataService.execute_prepared_w_connector(connector=connector, query=query_outputs,
+                                                               params=[block_num], fetch="all")
         output_txos = [{"position": row["position"], "txo_id": bytes(row["txo_id"]),
                         "node_id": row["node_id"], "value": bytes(row["value"]), "alias": row["alias"],
                         "reuse": row.get("reuse", -1), "reveal": row.get("reveal", -1)} for row in output_txos]
@@ -136,6 +138,7 @@ def populate_edges(db: dict, start: int, end: int, do: bool, block_step: int, ex
                           "total_sent = t.total_sent + EXCLUDED.total_sent")
 
         new_edges = list(new_edges.values())
-        DataService(**db).insert(table=TransactionEdge.table_name(), objs=new_edges, on_conflict_do=on_conflict_do)
+        DataService(**db).upsert(table=TransactionEdge.table_name(), rows=new_edges,
+                                 types=TransactionEdge.copy_types(), on_conflict_do=on_conflict_do)
 
     DataService(**db).execute_query(TransactionEdge.drop_constraint_a_b())
@@ -34,8 +34,9 @@ def populate_undirected_edges(db: dict, start: int,  end: int, do: bool, block_s
     def get_edges_block(worker_state, block_num):
 
         connector = worker_state["pool"].getconn()
-        query = f"SELECT a, b FROM {TransactionEdge.table_name()} WHERE reveal = {block_num}"
-        block_edges = DataService.execute_query_w_connector(connector=connector, query=query, fetch="all")
+        query = f"SELECT a, b FROM {TransactionEdge.table_name()} WHERE reveal = $1"
+        block_edges = DataService.execute_prepared_w_connector(connector=connector, query=query,
+                                                               params=[block_num], fetch="all")
         worker_state["pool"].putconn(connector)
 
         new_edges = set()
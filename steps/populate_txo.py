@@ -1,86 +1,140 @@
 
-import os
+import numpy as np
 
 from tqdm import tqdm
+from typing import Dict, List, Tuple
 
-from psycopg2 import Binary
-
-from blockchain.read_binary_files import process_file
+from blockchain.read_binary_files import read_file_blocks, file_name
 from blockchain.hash_methods import hash160, sha256
+from blockchain.script.match import match_owner_scripts, detect_script_in_unlocking, detect_scripts_in_witnesses
+from blockchain.parallel import parallel_map
 from database.dataService import DataService, Condition
+from database.batch import ColumnBatch, VarBytes, fixed_bytes
 
-from database.dbmodels.block import Block
 from database.dbmodels.txo import Spent_TXO, Created_TXO
 from database.dbmodels.script import Script
 from database.dbmodels.node import Node
-from database.utils import prepare_table
-
-
-def extract_from_file(file: str, folder: str, hash2num: dict, start: int, add_script: bool = False):
-
-    blocks = process_file(file, folder, drop_zero=True)  # a list of raw blocks
-    blocks = [block for block in blocks if block.hash in hash2num and hash2num[block.hash] >= start]
-    for block in blocks:
-        block.block_num = hash2num[block.hash]  # get the number of the block from its hash
-
-    new_spent = list()
-    new_created = list()
-    new_nodes = dict()
+from database.utils import prepare_table, fetch_block_locations
+
+
+def concatenate(parts: list, dtype, width: int = None) -> np.ndarray:
+    if len(parts) == 0:
+        return np.zeros((0, width) if width is not None else 0, dtype=dtype)
+    return np.concatenate(parts).astype(dtype, copy=False)
+
+
+def collect_nodes(owners: np.ndarray, owner_sizes: np.ndarray,
+                  block_nums: np.ndarray) -> Tuple[np.ndarray, ColumnBatch]:
+    # the distinct owners of the created TXOs, in the order of their first appearance, with the block of their first
+    # appearance (reveal) and of their second one (reuse), return the index of the owner of each TXO and the nodes
+    keys = np.ascontiguousarray(np.hstack([owner_sizes.astype(np.uint8).reshape(-1, 1), owners]))
+    keys = keys.view(np.dtype((np.void, keys.shape[1]))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    node = rank[inverse.ravel()]
+    sort = np.lexsort((block_nums, node))  # by node, then by block
+    sorted_block_nums = block_nums[sort]
+    group_start = np.flatnonzero(np.diff(node[sort], prepend=-1) != 0)
+    reuse = np.full(len(order), 100000000, dtype=np.int32)
+    has_reuse = np.diff(group_start, append=len(sort)) > 1
+    reuse[has_reuse] = sorted_block_nums[group_start[has_reuse] + 1]
+    first_owners, first_sizes = owners[first[order]], owner_sizes[first[order]]
+    offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(first_sizes, out=offsets[1:])
+    nodes = ColumnBatch({"hash": VarBytes(data=first_owners[np.arange(32) < first_sizes.reshape(-1, 1)].tobytes(),
+                                          offsets=offsets),
+                         "reveal": sorted_block_nums[group_start].astype(np.int32),
+                         "reuse": reuse})
+    return node, nodes
+
+
+def extract_from_file(file: str, folder: str, locations: List[Tuple[int, int]], add_script: bool = False,
+                      strict_script_types: bool = False, n_threads: int = 1) -> Dict[str, ColumnBatch]:
+
+    # the rows are collected as columns, and sent back to the main process as contiguous arrays
+    spent_block_num, spent_position, spent_txo_id = [], [], []
+    created_block_num, created_position, created_txo_id, created_tp, created_value = [], [], [], [], []
+    created_owner, created_owner_size = [], []
     new_scripts = dict()
 
-    for block in blocks:
-        for position, transaction in enumerate(block.transactions):  # for each transaction found in the block
-            if position > 0:
-                for txo_in in transaction.txos_in:  # for each input TXO
-                    new_spent.append(Spent_TXO(block_num=block.block_num, position=position,
-                                               txo_id=Binary(txo_in.txo_id)))
-                    if add_script:  # if we want to add scripts to the db
-                        try:
-                            locking_script = txo_in.hidden_locking_script
-                        except Exception as e:
-                            raise e
-                        if locking_script is not None:  # script detected in the unlocking script / witness
-                            new_scripts[locking_script] = min(block.block_num,
-                                                              new_scripts.get(locking_script, 1000000000))
-            for txo_out in transaction.txos_out:  # for each output TXO
-                try:
-                    tp, owner = txo_out.owner
-                except Exception as e:
-                    print(f"Impossible to decode the script of tx_out (block {block.block_num}, position {position}, "
-                          f"v_out {txo_out.vout}): {txo_out.script}, error: {e}")
-                    continue
-                new_created.append({
-                    "block_num": block.block_num,
-                    "position": position,
-                    "id": Binary(txo_out.txo_id),
-                    "tp": tp,
-                    "value": Binary(txo_out.value),
-                    "owner": owner  # we set the address but we will change it later
-                })
-                if owner in new_nodes:
-                    new_dict = {"reveal": min(new_nodes[owner]["reveal"], block.block_num)}
-                    if new_nodes[owner]["reveal"] < block.block_num:
-                        new_dict["reuse"] = min(block.block_num, new_nodes[owner]["reuse"])
-                    else:
-                        new_dict["reuse"] = new_nodes[owner]["reveal"]
-                    new_nodes[owner] = new_dict
-                else:
-                    new_nodes[owner] = {"reveal": block.block_num,
-                                        "reuse": 100000000}
-                if (tp in [6]) and add_script:
-                    new_scripts[txo_out.script] = min(block.block_num, new_scripts.get(txo_out.script, 1000000000))
+    # only the selected blocks are read, using their locations (block_num, byte_start) in the file
+    # n_threads: number of threads used to compute the ids of the transactions of a block
+    for block in read_file_blocks(file, folder, locations, drop_zero=True, columnar=True, n_threads=n_threads):
+        block_num = block.block_num
+
+        # the spent TXOs, i.e. all the inputs except the one of the coinbase
+        spent = block.input_vout >= 0
+        spent_block_num.append(np.full(spent.sum(), block_num))
+        spent_position.append(block.input_position[spent])
+        spent_txo_id.append(block.input_txo_ids)
+        if add_script:  # if we want to add scripts to the db
+            # scripts detected in the unlocking scripts, then in the witnesses (in one batch)
+            # the spans of the scripts are read from the columns, without building the transactions
+            locking_scripts, witnesses = [], []
+            for unlocking_script, witness in zip(*block.input_scripts()):
+                locking_script = detect_script_in_unlocking(script=unlocking_script)
+                if locking_script is not None:
+                    locking_scripts.append(locking_script)
+                elif len(witness) > 0:
+                    witnesses.append(witness)
+            locking_scripts += detect_scripts_in_witnesses(witnesses)
+            for locking_script in locking_scripts:
+                if locking_script is not None:
+                    locking_script = bytes(locking_script)
+                    new_scripts[locking_script] = min(block_num, new_scripts.get(locking_script, 1000000000))
+
+        # the created TXOs, all the scripts of the block are matched in one batch
+        scripts, offsets = block.output_scripts()
+        output_position = block.output_position
+        tps, owners, owner_sizes = match_owner_scripts(scripts, offsets, strict=strict_script_types)
+        decoded = tps >= 0
+        for i in np.flatnonzero(~decoded).tolist():
+            print(f"Impossible to decode the script of tx_out (block {block_num}, position {output_position[i]}, "
+                  f"v_out {block.output_vout[i]}): {scripts[offsets[i]: offsets[i + 1]]}")
+        if add_script:
+            for i in np.flatnonzero(tps == 6).tolist():
+                script = scripts[offsets[i]: offsets[i + 1]]
+                new_scripts[script] = min(block_num, new_scripts.get(script, 1000000000))
+        created_block_num.append(np.full(decoded.sum(), block_num))
+        created_position.append(output_position[decoded])
+        created_txo_id.append(block.output_txo_ids[decoded])
+        created_tp.append(tps[decoded])
+        created_value.append(block.output_value_bytes[decoded])
+        created_owner.append(owners[decoded])
+        created_owner_size.append(owner_sizes[decoded])
+
+    # the owners of the created TXOs, replaced by the indexes of the nodes (themselves replaced later by their ids)
+    created_block_num = concatenate(created_block_num, np.int32)
+    created_node, nodes = collect_nodes(owners=concatenate(created_owner, np.uint8, 32),
+                                        owner_sizes=concatenate(created_owner_size, np.int8),
+                                        block_nums=created_block_num)
+
     return {
-        "spent": new_spent,
-        "created": new_created,
-        "scripts": [Script(reveal=num, hash160=Binary(hash160(script)), hash256=Binary(sha256(script)),
-                           script=Binary(script)) for script, num in new_scripts.items()],
-        "nodes": [Node(hash=Binary(owner), reveal=val["reveal"],
-                       reuse=val["reuse"]) for owner, val in new_nodes.items()]
+        "spent": ColumnBatch({"block_num": concatenate(spent_block_num, np.int32),
+                              "position": concatenate(spent_position, np.int32),
+                              "txo_id": concatenate(spent_txo_id, np.uint8, 36)}),
+        "created": ColumnBatch({"block_num": created_block_num,
+                                "position": concatenate(created_position, np.int32),
+                                "txo_id": concatenate(created_txo_id, np.uint8, 36),
+                                "tp": concatenate(created_tp, np.int16),
+                                "value": concatenate(created_value, np.uint8, 8),
+                                "node": created_node}),
+        "scripts": ColumnBatch({"reveal": np.array(list(new_scripts.values()), dtype=np.int32),
+                                "hash160": fixed_bytes([hash160(script) for script in new_scripts], 20),
+                                "hash256": fixed_bytes([sha256(script) for script in new_scripts], 32),
+                                "script": VarBytes.from_list(list(new_scripts))}),
+        "nodes": nodes
     }
 
 
 def populate_txo(db: dict, start: int, end: int, folder: str, add_script: bool = True,
-                 create_index: bool = False, do: bool = True, safe_mode: bool = True):
+                 create_index: bool = False, do: bool = True, safe_mode: bool = True, n_jobs: int = -1,
+                 strict_script_types: bool = False, n_threads: int = 1):
+
+    # strict_script_types: the P2WPKH, P2WSH and P2TR templates are fully matched, which changes the types of the
+    # created TXOs and their owners (see README), the tables must then be populated from the first block
 
     if not do:
         return None
@@ -97,6 +151,12 @@ def populate_txo(db: dict, start: int, end: int, folder: str, add_script: bool =
 
     if start < end:
 
+        if strict_script_types and start >= 0:
+            print(f"The tables are populated up to the block {start} and are extended with the strict script types, "
+                  f"the types of the previous TXOs may differ (see README), press 'y' to continue.")
+            if safe_mode:
+                assert input() == "y"
+
         if safe_mode:
             print("Press 'y' to confirm the drop of all indexes.")
             assert input() == "y"
@@ -116,28 +176,25 @@ def populate_txo(db: dict, start: int, end: int, folder: str, add_script: bool =
 
         ds = DataService(**db)
         conditions = [Condition("num", ">", start), Condition("num", "<=", end)]
-        rows = ds.fetch(table=Block.table_name(), columns=["hash", "num", "num_file"], conditions=conditions)
-        hash2num = {bytes(row["hash"]): row["num"] for row in rows}
-        selected_files = set([int(row['num_file']) for row in rows])
-        block_files = os.listdir(folder)
-        files = [file for file in block_files if "blk" in file and
-                 int(file.split(".")[0].replace("blk", "")) in selected_files]
-        files = sorted(files, key=lambda name: int(name.replace("blk", "").replace(".dat", "")))
+        file2locations = dict()  # each worker only receives the locations of the blocks of its file
+        for block_num, num_file, byte_start in fetch_block_locations(ds=ds, conditions=conditions):
+            file2locations.setdefault(num_file, []).append((block_num, byte_start))
+        tasks = [{"file": file_name(num_file), "locations": file2locations[num_file]}
+                 for num_file in sorted(file2locations)]
 
-        ds = DataService(**db)
-        connector_pool = DataService(**db).pool(min_connection=5, max_connection=20)
+        ds = DataService(**db)  # the insertions use the connections of the shared pool
 
         try:
 
-            for file in tqdm(files):  # do for each selected file (i.e. containing a block to be added)
-
-                data = extract_from_file(file=file, folder=folder, hash2num=hash2num, start=start,
-                                         add_script=add_script)
+            # the selected files (i.e. containing a block to be added) are parsed in parallel, in the order of the
+            # files, while the previous ones are inserted
+            for data in tqdm(parallel_map(extract_from_file, tasks, n_jobs=n_jobs, folder=folder,
+                                          add_script=add_script, strict_script_types=strict_script_types,
+                                          n_threads=n_threads),
+                             total=len(tasks)):
 
                 # insert the spent TXOs
-                connector = connector_pool.getconn()
-                ds.insert(table=Spent_TXO.table_name(), objs=data["spent"], connector=connector)
-                connector_pool.putconn(connector)
+                ds.bulk_load(table=Spent_TXO.table_name(), rows=data["spent"], types=Spent_TXO.copy_types())
 
                 # insert the nodes, in order to get the indexes for the insertion of the created TXOs
                 on_conflict_do = " ON CONFLICT (hash) DO UPDATE SET reveal = LEAST(t.reveal,EXCLUDED.reveal)," + \
@@ -147,28 +204,24 @@ def populate_txo(db: dict, start: int, end: int, folder: str, add_script: bool =
                                  " ELSE t.reveal END"
                 returning = " RETURNING hash,node_id"
                 # after inserting the nodes, we get back their ids
-                connector = connector_pool.getconn()
-                node_rows = ds.insert(table=Node.table_name(), objs=data["nodes"], on_conflict_do=on_conflict_do,
-                                      returning=returning, connector=connector)
-                connector_pool.putconn(connector)
-                owner2node_id = {bytes(row["hash"]): row["node_id"] for row in node_rows}
-
-                # insert the created TXOs (but before add the ids)
-                created = [Created_TXO(block_num=new_created["block_num"], position=new_created["position"],
-                                       txo_id=new_created["id"], tp=new_created["tp"], value=new_created["value"],
-                                       node_id=owner2node_id[new_created["owner"]])
-                           for new_created in data["created"]]
-                connector = connector_pool.getconn()
-                ds.insert(table=Created_TXO.table_name(), objs=created, connector=connector)
-                connector_pool.putconn(connector)
+                nodes = data["nodes"]
+                owner2node_id = dict()
+                for node_rows in ds.upsert(table=Node.table_name(), rows=nodes, types=Node.copy_types(),
+                                           on_conflict_do=on_conflict_do, returning=returning) or []:
+                    owner2node_id.update((bytes(node_hash), node_id) for node_hash, node_id in node_rows)
+                node_ids = np.array([owner2node_id[nodes.value("hash", i)] for i in range(len(nodes))],
+                                    dtype=np.int64)
+
+                # insert the created TXOs (but before replace the index of the owner by its id)
+                created = data["created"]
+                created.columns["node_id"] = node_ids[created.columns.pop("node")]
+                ds.bulk_load(table=Created_TXO.table_name(), rows=created, types=Created_TXO.copy_types())
 
                 # insert the scripts
                 if add_script:
                     on_conflict_do = " ON CONFLICT (hash160) DO UPDATE SET reveal = LEAST(t.reveal,EXCLUDED.reveal)"
-                    connector = connector_pool.getconn()
-                    ds.insert(table=Script.table_name(), objs=data["new_scripts"], on_conflict_do=on_conflict_do,
-                              connector=connector)
-                    connector_pool.putconn(connector)
+                    ds.upsert(table=Script.table_name(), rows=data["scripts"], types=Script.copy_types(),
+                              on_conflict_do=on_conflict_do)
 
         except Exception as e:
             print(f"Failure, we recommend to rollback to the previous state: {start}")